@@ -0,0 +1,114 @@
+import gzip
+import json
+import time
+import logging
+import threading
+import functools
+import multiprocessing
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+
+class Archive(object):
+    """
+    Append-only archive of the raw pages and JSON bodies a run fetched, in the spirit of WARC: every record is a gzip
+    member of its own holding a JSON header line (url, kind, date and any extra fields) followed by the body. The file
+    can be appended to across runs and any record read back without decompressing the ones before it.
+
+    `<path>.idx` is the index of the records, one `offset<TAB>length<TAB>kind<TAB>url` line each.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.count = 0
+        self.file = open(path, "ab")
+        self.index = open(index_path(path), "a", encoding="utf-8")
+
+    def record(self, url, body, kind, **meta):
+        """
+        :param url: url the body is fetched from.
+        :param body: page source or JSON body as `str` or `bytes`.
+        :param kind: what the body is, so a replay can pick the records it parses. Eg: response
+        """
+        header = dict(meta, url=url, kind=kind, date=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))
+        body = body.encode("utf-8") if isinstance(body, str) else body
+        member = gzip.compress(json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n" + body)
+        with self.lock:
+            offset = self.file.tell()
+            self.file.write(member)
+            self.file.flush()
+            self.index.write("{}\t{}\t{}\t{}\n".format(offset, len(member), kind, url))
+            self.index.flush()
+            self.count += 1
+
+    def close(self):
+        log.info("{} responses are recorded to {}".format(self.count, self.path))
+        self.file.close()
+        self.index.close()
+
+
+def index_path(path):
+    return "{}.idx".format(path)
+
+
+def read_index(path, kind=None, latest=False):
+    """
+    :param kind: only the records of this kind, when given.
+    :param latest: only the last record of every url, for archives appended to by several runs.
+    :return: `list` of (offset, length, kind, url) of the records, in the order of the archive.
+    """
+    entries = []
+    with open(index_path(path), "r", encoding="utf-8") as f:
+        for line in f:
+            offset, length, entry_kind, url = line.rstrip("\n").split("\t", 3)
+            if kind is None or entry_kind == kind:
+                entries.append((int(offset), int(length), entry_kind, url))
+    if latest:
+        entries = sorted({entry[3]: entry for entry in entries}.values())
+    return entries
+
+
+def read_record(f, offset, length):
+    """
+    :param f: archive opened in binary mode.
+    :return: (header, body) of the record at `offset`, with the body as `str`.
+    """
+    f.seek(offset)
+    header, body = gzip.decompress(f.read(length)).split(b"\n", 1)
+    return json.loads(header.decode("utf-8")), body.decode("utf-8", errors="replace")
+
+
+def parse_records(path, parse, entries):
+    with open(path, "rb") as f:
+        return [(url, parse(url, read_record(f, offset, length)[1])) for offset, length, _, url in entries]
+
+
+def replay(path, parse, kind=None, match=None, latest=True, processes=None, chunk_size=200):
+    """
+    Runs `parse(url, body)` over the recorded records with no browser or network, on `processes` worker processes
+    (one per core by default). Every worker opens the archive itself, so only the index and the results cross
+    processes. `parse` has to be picklable, Eg: a module level function or a classmethod. `match` is run on the urls
+    in this process to leave records out before they are read at all.
+
+    :return: generator of (url, result) in the order of the archive.
+    """
+    entries = [entry for entry in read_index(path, kind, latest) if match is None or match(entry[3])]
+    chunks = [entries[idx:idx + chunk_size] for idx in range(0, len(entries), chunk_size)]
+    log.info("Replaying {} records of {} on {} processes".format(
+        len(entries), path, processes or multiprocessing.cpu_count()))
+    with multiprocessing.Pool(processes) as pool:
+        for results in pool.imap(functools.partial(parse_records, path, parse), chunks):
+            for result in results:
+                yield result
+
+
+def open_archive(path):
+    """
+    :return: `Archive` at `path`, or None when no path is given.
+    """
+    if not path:
+        return None
+    log.info("Fetched responses are recorded to {}".format(path))
+    return Archive(path)
@@ -0,0 +1,74 @@
+import os
+import re
+import time
+import random
+import argparse
+import tempfile
+
+import cities
+from bench_contacts import get_bios
+
+
+def get_names(count, seed=0):
+    # Made-up city names on top of cities.txt, to see how the scan holds up with a gazetteer of tens of thousands.
+    rnd = random.Random(seed)
+    syllables = ("ka", "ri", "lo", "ven", "dor", "ba", "shi", "pur", "ton", "gar", "mel", "ana", "zu", "qui", "rth")
+    names = set()
+    while len(names) < count:
+        names.add("".join(rnd.choice(syllables) for _ in range(rnd.randint(3, 5))).capitalize())
+    return sorted(names)
+
+
+def get_city_bios(bios, names, seed=0):
+    rnd = random.Random(seed)
+    return [bio + (" based in {}".format(rnd.choice(names)) if rnd.random() < 0.3 else "") for bio in bios]
+
+
+def find_before(patterns, bio):
+    # One word-bounded regex per city, the straightforward way to do it without an automaton.
+    return ", ".join(name for name, pattern in patterns if pattern.search(bio))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Throughput of the city gazetteer.")
+    arg_parser.add_argument('-bios', '--bios', type=int, default=100000, help='No. of synthetic bios.')
+    arg_parser.add_argument('-names', '--names', type=int, default=30000, help='No. of made-up names to add.')
+    arg_parser.add_argument('-sample', '--sample', type=int, default=500,
+                            help='No. of bios the per-city regex loop is timed on. It is far too slow for all.')
+    args = arg_parser.parse_args()
+
+    names = cities.Gazetteer.read_names(cities.CITIES) + get_names(args.names)
+    bios = get_city_bios(get_bios(args.bios), [entry.split("|")[0] for entry in names])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path, cache = os.path.join(tmp, "cities.txt"), os.path.join(tmp, "cities.pickle")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(names))
+        start = time.time()
+        gazetteer = cities.Gazetteer.load(path, cache)
+        sec_build = time.time() - start
+        start = time.time()
+        cities.Gazetteer.load(path, cache)
+        sec_load = time.time() - start
+    print("gazetteer: {} names; {} states; built in {:.2f}s; loaded from disk in {:.2f}s".format(
+        len(gazetteer.names), len(gazetteer.goto), sec_build, sec_load))
+
+    start = time.time()
+    found = [gazetteer.find(bio) for bio in bios]
+    sec_scan = time.time() - start
+    print("automaton: {} bios in {:.2f}s ({:.0f} bios/s); {} with a city".format(
+        len(bios), sec_scan, len(bios) / sec_scan, sum(1 for city in found if city)))
+
+    patterns = [(name, re.compile(r"\b{}\b".format(re.escape(name)), re.IGNORECASE))
+                for name in (entry.split("|")[0] for entry in names)]
+    sample = bios[:args.sample]
+    start = time.time()
+    for bio in sample:
+        find_before(patterns, bio)
+    sec_before = time.time() - start
+    print("regex per city: {} bios in {:.2f}s ({:.0f} bios/s)".format(len(sample), sec_before,
+                                                                       len(sample) / sec_before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import re
+import time
+import random
+import argparse
+
+import contacts
+
+
+WORDS = ("streetwear", "designer", "brand", "official", "shop", "drops", "every", "friday", "worldwide", "shipping",
+         "collabs", "dm", "for", "orders", "link", "in", "bio", "female", "male", "owned", "est.", "2019", "la", "nyc")
+CONTACTS = ("mail: {name}@gmail.com", "{name}.shop@brand-mail.co.in", "call +91-98{digits}", "+1 (212) 555-{four}",
+            "{three}-{three}-{four}", "whatsapp +44 7700 900{three}")
+
+
+def get_bios(count, seed=0):
+    rnd = random.Random(seed)
+    bios = []
+    for idx in range(count):
+        words = [rnd.choice(WORDS) for _ in range(rnd.randint(5, 25))]
+        # Roughly a third of the bios have a contact in them, like the scraped ones.
+        if rnd.random() < 0.35:
+            words.insert(rnd.randint(0, len(words)), rnd.choice(CONTACTS).format(
+                name="user{}".format(idx), digits=rnd.randint(10000000, 99999999),
+                three=rnd.randint(100, 999), four=rnd.randint(1000, 9999)))
+        bios.append(" ".join(words))
+    return bios
+
+
+def extract_before(bio):
+    # The per-bio loops the Instagram classes had before contacts.py.
+    emails = []
+    for pattern in contacts.EMAIL_PATTERNS:
+        emails.extend(re.findall(pattern, bio))
+    phones = set()
+    for pattern in contacts.PHONE_PATTERNS:
+        for match in re.finditer(pattern, bio, re.MULTILINE):
+            phones.add(match.group())
+    gender = "Female" if " female " in bio.lower() else ("Male" if " male " in bio.lower() else None)
+    return {"email": ", ".join(emails), "phone": phones, "gender": gender}
+
+
+def bench(fn, bios):
+    start = time.time()
+    result = fn(bios)
+    return time.time() - start, result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Contact extraction time of the old per-bio loops vs contacts.py.")
+    arg_parser.add_argument('-bios', '--bios', type=int, default=100000, help='No. of synthetic bios.')
+    args = arg_parser.parse_args()
+
+    bios = get_bios(args.bios)
+    sec_before, before = bench(lambda items: [extract_before(bio) for bio in items], bios)
+    sec_after, after = bench(lambda items: [contacts.extract(bio) for bio in items], bios)
+
+    for row, single in zip(before, after):
+        assert row["email"] == single["email"]
+        assert row["phone"] == set(filter(None, single["phone"].split(", ")))
+        assert row["gender"] == single["gender"]
+    if contacts.pd is not None:
+        frame = contacts.extract_many(bios)
+        assert frame.to_dict("records") == after
+
+    print("bios: {}; with an email: {}; with a phone: {}".format(
+        len(bios), sum(1 for row in after if row["email"]), sum(1 for row in after if row["phone"])))
+    for name, sec in (("per-bio loops", sec_before), ("contacts.extract", sec_after)):
+        print("{}: {:.2f}s ({:.0f} bios/s)".format(name, sec, len(bios) / sec))
+
+
+if __name__ == '__main__':
+    main()
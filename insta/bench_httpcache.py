@@ -0,0 +1,79 @@
+import json
+import time
+import argparse
+import tempfile
+import threading
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from transport import Transport
+from httpcache import HttpCache
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers every `/<username>/?__a=1` with a profile and an ETag, and with a bodyless 304 when the ETag is sent back.
+    """
+    latency = 0.02
+    sent = 0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        username = self.path.strip("/").split("/")[0]
+        etag = '"{}"'.format(username)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        body = json.dumps({"graphql": {"user": {"username": username, "full_name": username,
+                                                "biography": "lorem ipsum " * 200,
+                                                "edge_followed_by": {"count": 1}}}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+        StubHandler.sent += len(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(transport, urls):
+    start, sent = time.time(), StubHandler.sent
+    bodies = [transport.get(url).json() for url in urls]
+    return time.time() - start, StubHandler.sent - sent, bodies
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Cold vs revalidated runs of the http cache on a local stub.")
+    arg_parser.add_argument('-users', '--users', type=int, default=300, help='No. of profiles to fetch per run.')
+    arg_parser.add_argument('-latency', '--latency', type=float, default=0.02, help='Stub response time in seconds.')
+    args = arg_parser.parse_args()
+
+    StubHandler.latency = args.latency
+    server = ThreadingServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = ["http://127.0.0.1:{}/user{}/?__a=1".format(server.server_port, idx) for idx in range(args.users)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        transport = Transport(cache=HttpCache(tmp))
+        sec_cold, sent_cold, cold = run(transport, urls)
+        sec_warm, sent_warm, warm = run(transport, urls)
+        assert cold == warm
+        print("cold: {:.2f}s; {} KB of bodies sent".format(sec_cold, sent_cold // 1024))
+        print("revalidated: {:.2f}s; {} KB of bodies sent; {} answered from the cache".format(
+            sec_warm, sent_warm // 1024, transport.cache.hits))
+        transport.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
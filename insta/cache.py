@@ -0,0 +1,52 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+
+class ProfileCache(object):
+    """
+    Persistent cache of the users already scraped, keyed by username. It holds the parsed row (name, follower count,
+    biography and what was extracted from it) as written to the sink, so a cached user costs no request at all.
+
+    An entry is served only while it's younger than `ttl` seconds.
+    """
+
+    def __init__(self, path="profiles.db", ttl=7 * 24 * 60 * 60):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS profiles (username TEXT PRIMARY KEY, profile TEXT, fetched_at REAL)")
+
+    def get(self, username):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT profile, fetched_at FROM profiles WHERE username = ?", (username, )).fetchone()
+            if row is None or time.time() - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, username, profile):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO profiles VALUES (?, ?, ?)",
+                              (username, json.dumps(profile, ensure_ascii=False), time.time()))
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return 100.0 * self.hits / total if total else 0.0
+
+    def close(self):
+        log.info("Profile cache hits: {}; misses: {}; hit rate: {:.1f}%".format(
+            self.hits, self.misses, self.hit_rate()))
+        self.conn.close()
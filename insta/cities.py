@@ -0,0 +1,143 @@
+import os
+import pickle
+import hashlib
+import logging
+import threading
+from collections import deque
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CITIES = os.path.join(HERE, "cities.txt")
+CACHE = os.path.join(HERE, "cities.pickle")
+
+
+class Gazetteer(object):
+    """
+    Finds the city names mentioned in a text with an Aho-Corasick automaton, in one pass over the text however many
+    names there are. Names match case-insensitively and only as whole words, so "Pune" is found in "pune based" but not
+    in "punes".
+
+    Every entry of `names` is a city, optionally followed by its other spellings after a `|`. Eg: "Mumbai|Bombay".
+    Any of them is reported by the first one. The automaton is built once and is picklable, so `load` keeps it on disk
+    next to the names file.
+    """
+
+    def __init__(self, names):
+        self.names = []
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        for entry in names:
+            spellings = [name.strip() for name in entry.split("|") if name.strip()]
+            if spellings:
+                self.names.append(spellings[0])
+                for name in spellings:
+                    self.add(name, len(self.names) - 1)
+        self.link()
+
+    def add(self, name, idx):
+        key = name.casefold()
+        node = 0
+        for char in key:
+            child = self.goto[node].get(char)
+            if child is None:
+                child = len(self.goto)
+                self.goto[node][char] = child
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+            node = child
+        if not self.out[node]:
+            self.out[node] = ((len(key), idx), )
+
+    def link(self):
+        # Breadth first, so the fail link of a node's parent is always set before the node's own.
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fail = self.fail[node]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[child] = self.goto[fail].get(char, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def find_all(self, text):
+        """
+        :return: `list` of (start, end, name) of the whole-word matches, leftmost-longest and not overlapping.
+        """
+        text = (text or "").casefold()
+        goto, fail, out = self.goto, self.fail, self.out
+        found, node = [], 0
+        for end, char in enumerate(text, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, idx in out[node]:
+                start = end - length
+                if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+                    found.append((start, end, idx))
+
+        matches, last = [], 0
+        for start, end, idx in sorted(found, key=lambda match: (match[0], match[0] - match[1])):
+            if start >= last:
+                matches.append((start, end, self.names[idx]))
+                last = end
+        return matches
+
+    def find(self, text):
+        """
+        :return: the distinct cities in the text joined by ", ", in the order they are mentioned. Eg: "Mumbai, Pune"
+        """
+        return ", ".join(dict.fromkeys(name for _, _, name in self.find_all(text)))
+
+    @classmethod
+    def read_names(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+    @classmethod
+    def load(cls, path=CITIES, cache=CACHE):
+        """
+        Loads the automaton of the names in `path` from `cache`, or builds and saves it there when the cache is
+        missing or was built from another version of the names file.
+        """
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        if os.path.exists(cache):
+            try:
+                with open(cache, "rb") as f:
+                    cached_digest, gazetteer = pickle.load(f)
+                if cached_digest == digest:
+                    return gazetteer
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError) as e:
+                log.debug("Ignoring the cached gazetteer at {}: {}".format(cache, e))
+
+        gazetteer = cls(cls.read_names(path))
+        log.info("Gazetteer built from {} names in {}".format(len(gazetteer.names), path))
+        try:
+            with open(cache + ".tmp", "wb") as f:
+                pickle.dump((digest, gazetteer), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(cache + ".tmp", cache)
+        except OSError as e:
+            log.debug("Couldn't save the gazetteer to {}: {}".format(cache, e))
+        return gazetteer
+
+
+_gazetteer = None
+_lock = threading.Lock()
+
+
+def get_gazetteer():
+    global _gazetteer
+    with _lock:
+        if _gazetteer is None:
+            _gazetteer = Gazetteer.load()
+    return _gazetteer
+
+
+def get_city(bio):
+    return get_gazetteer().find(bio)
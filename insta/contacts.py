@@ -0,0 +1,89 @@
+import re
+import logging
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+EMAIL_PATTERNS = (
+    r"([a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+)",
+)
+
+PHONE_PATTERNS = (
+    # India
+    r"(\+91-)?(\+91)?([7-9]{1})([0-9]{9})",
+
+    # North america (https://www.oreilly.com/library/view/regular-expressions-cookbook/9781449327453/ch04s02.html)
+    r"^\(?([0-9]{3})\)?[-.●]?([0-9]{3})[-.●]?([0-9]{4})$",
+
+    # General
+    r"(([+][(]?[0-9]{1,3}[)]?)|([(]?[0-9]{4}[)]?))\s*[)]?[-\s\.]?[(]?[0-9]{1,3}[)]?([-\s\.]?[0-9]{3})([-\s\.]?[0-9]{3,4})",
+)
+
+# Every email holds an `@` and every phone number a digit, so a bio without them is skipped without running the
+# patterns of that kind at all. Most bios have no contact in them.
+DIGIT = re.compile(r"[0-9]")
+
+# Characters a match of each phone pattern can start with. Without a literal to start from, the regex engine tries
+# the India and General patterns at every position of the bio; the lookahead turns most of those tries down at
+# once. It finds the same matches. The North America one is anchored with `^` and cheap already.
+PHONE_STARTS = (r"[+7-9]", None, r"[+(0-9]")
+
+EMAILS = tuple(re.compile(pattern) for pattern in EMAIL_PATTERNS)
+PHONES = tuple(re.compile(pattern if first is None else "(?={}){}".format(first, pattern), re.MULTILINE)
+               for pattern, first in zip(PHONE_PATTERNS, PHONE_STARTS))
+
+
+def has_email(bio):
+    return "@" in bio
+
+
+def has_phone(bio):
+    return DIGIT.search(bio) is not None
+
+
+def get_email(bio):
+    """
+    :return: the emails in the bio joined by ", ", in the order of the patterns and then of the bio.
+             Eg: "a@b.com, c@d.in"
+    """
+    if not bio or not has_email(bio):
+        return ""
+    return ", ".join(match.group() for pattern in EMAILS for match in pattern.finditer(bio))
+
+
+def get_phone(bio):
+    """
+    :return: the distinct phone numbers in the bio joined by ", ", in the order of the patterns and then of the bio.
+    """
+    if not bio or not has_phone(bio):
+        return ""
+    return ", ".join(dict.fromkeys(match.group() for pattern in PHONES for match in pattern.finditer(bio)))
+
+
+def get_gender(bio):
+    bio = (bio or "").lower()
+    if " female " in bio:
+        return "Female"
+    elif " male " in bio:
+        return "Male"
+
+
+def extract(bio):
+    return {"email": get_email(bio), "phone": get_phone(bio), "gender": get_gender(bio)}
+
+
+def extract_many(bios):
+    """
+    `extract` of a whole batch of bios (Eg: an archived users file) as a pandas `DataFrame` with email, phone and
+    gender columns, on the index of `bios` when it's a `Series`. A bio without a gender has None in the column.
+    """
+    if pd is None:
+        raise ImportError("pandas is needed for a DataFrame of the bios. Install it or use `extract` per bio.")
+    index = bios.index if isinstance(bios, pd.Series) else None
+    rows = [extract(None if isinstance(bio, float) else bio) for bio in bios]
+    return pd.DataFrame(rows, index=index, columns=["email", "phone", "gender"], dtype=object)
@@ -0,0 +1,158 @@
+import logging
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+# The 3rd child of the tag page's <article> holds the most recent posts; the ones before it are the top posts.
+JS_POST_LINKS = """
+var article = document.querySelector("article");
+if (!article || article.childNodes.length < 3) return [];
+var links = article.childNodes[2].querySelectorAll('a[href^="/p/"]');
+return Array.prototype.slice.call(links, 0, arguments[0]).map(function (link) {
+    return link.getAttribute("href");
+});
+"""
+
+# Keeps every recent post link added to the page from now on in window.__harvest, so a scroll costs the Python side
+# only the links it added. The links present when it's installed are harvested as well.
+JS_INSTALL_HARVESTER = """
+if (window.__harvest) return true;
+var article = document.querySelector("article");
+if (!article || article.childNodes.length < 3) return false;
+var recent = article.childNodes[2], harvest = window.__harvest = {seen: {}, fresh: []};
+function collect(node) {
+    if (!node.querySelectorAll) return;
+    var links = Array.prototype.slice.call(node.querySelectorAll('a[href^="/p/"]'));
+    if (node.matches && node.matches('a[href^="/p/"]')) links.push(node);
+    links.forEach(function (link) {
+        var href = link.getAttribute("href");
+        if (!harvest.seen[href] && recent.contains(link)) {
+            harvest.seen[href] = true;
+            harvest.fresh.push(href);
+        }
+    });
+}
+collect(recent);
+harvest.observer = new MutationObserver(function (mutations) {
+    mutations.forEach(function (mutation) {
+        Array.prototype.forEach.call(mutation.addedNodes, collect);
+    });
+});
+harvest.observer.observe(recent, {childList: true, subtree: true});
+return true;
+"""
+
+JS_HARVEST = """
+var harvest = window.__harvest;
+if (!harvest) return null;
+var fresh = harvest.fresh;
+harvest.fresh = [];
+return fresh;
+"""
+
+
+def harvest(chrome):
+    """
+    Takes the post links the in-page observer collected since the last call, installing the observer first when the
+    page doesn't have one (Eg: on the first call or after a reload).
+
+    :param chrome: webdriver instance on a tag page.
+    :return: `list` of new post hrefs.
+    """
+    posts = chrome.execute_script(JS_HARVEST)
+    if posts is None:
+        if not chrome.execute_script(JS_INSTALL_HARVESTER):
+            return []
+        posts = chrome.execute_script(JS_HARVEST)
+    return posts or []
+
+
+JS_PAGE_STATE = """
+var harvest = window.__harvest;
+return [document.body.scrollHeight, document.querySelectorAll('article a[href^="/p/"]').length,
+        harvest ? harvest.fresh.length : 0];
+"""
+
+
+def page_state(chrome):
+    """
+    :param chrome: webdriver instance on a tag page.
+    :return: `list` of scroll height, no. of post links on the page and no. of links harvested but not yet taken.
+    """
+    return chrome.execute_script(JS_PAGE_STATE)
+
+
+def post_links(chrome, limit):
+    """
+    Reads the hrefs of the recent posts in the browser itself, instead of serializing and parsing the whole page.
+
+    :param chrome: webdriver instance on a tag page.
+    :param limit: max no. of posts to be read.
+    :return: `list` of post hrefs. Eg: /p/B-6mHlTgGfT/
+    """
+    return chrome.execute_script(JS_POST_LINKS, limit) or []
+
+
+# Hashtag edges carry the owner of each post. The first page comes with window._sharedData and every further page with
+# a graphql XHR, so the responses are tapped as they arrive and their owners kept in window.__owners by shortcode.
+JS_INSTALL_OWNER_TAP = """
+if (window.__owners) return true;
+var owners = window.__owners = {};
+function collect(data) {
+    (function walk(value) {
+        if (!value || typeof value !== "object") return;
+        if (value.shortcode && value.owner) {
+            owners[value.shortcode] = {id: value.owner.id || null, username: value.owner.username || null};
+        }
+        for (var key in value) walk(value[key]);
+    })(data);
+}
+try { collect(window._sharedData.entry_data.TagPage); } catch (e) {}
+var send = XMLHttpRequest.prototype.send;
+XMLHttpRequest.prototype.send = function () {
+    this.addEventListener("load", function () {
+        if (this.responseText && this.responseText.indexOf("edge_hashtag_to_media") !== -1) {
+            try { collect(JSON.parse(this.responseText)); } catch (e) {}
+        }
+    });
+    return send.apply(this, arguments);
+};
+return true;
+"""
+
+JS_OWNERS = """
+return window.__owners || {};
+"""
+
+
+def install_owner_tap(chrome):
+    """
+    Starts collecting the owners of the posts on a tag page. To be called once the page is loaded, before scrolling.
+    """
+    chrome.execute_script(JS_INSTALL_OWNER_TAP)
+
+
+def owners(chrome):
+    """
+    :param chrome: webdriver instance on a tag page with the owner tap installed.
+    :return: `dict` of shortcode => {"id": .., "username": ..}. Either of them may be None.
+    """
+    return chrome.execute_script(JS_OWNERS) or {}
+
+
+def soup(html, *args, **kwargs):
+    """
+    Parses only the parts of the page matching the given SoupStrainer arguments, with lxml when it's installed.
+
+    Eg: soup(html, "script")
+    """
+    only = SoupStrainer(*args, **kwargs) if args or kwargs else None
+    return BeautifulSoup(html, PARSER, parse_only=only)
@@ -0,0 +1,153 @@
+import os
+import gzip
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+
+class CachedResponse(object):
+    """
+    The parts of `requests.Response` the scripts read, for a body served from the cache.
+    """
+
+    def __init__(self, url, content, headers, encoding="utf-8"):
+        self.url = url
+        self.status_code = 200
+        self.content = content
+        self.headers = headers
+        self.encoding = encoding
+        self.from_cache = True
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class HttpCache(object):
+    """
+    On-disk cache of the responses that came with an ETag or a Last-Modified header. The next request for the url
+    sends them back as If-None-Match/If-Modified-Since, and a 304 is answered with the cached body instead.
+
+    Bodies are kept gzipped under `directory`, one file per url, with an SQLite index of their validators, sizes and
+    last use. Once the bodies take more than `max_bytes`, the least recently used ones are dropped.
+    """
+
+    def __init__(self, directory="http_cache", max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.stored = 0
+        self.evicted = 0
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, url TEXT, etag TEXT, last_modified TEXT, "
+                "encoding TEXT, size INTEGER, used_at REAL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_used_at ON entries (used_at)")
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], "{}.gz".format(key))
+
+    def headers(self, url):
+        """
+        :return: `dict` of the conditional headers to send for the url. Empty when it isn't cached.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified FROM entries WHERE key = ?", (self.key(url), )).fetchone()
+        if row is None:
+            return {}
+        headers = {}
+        if row[0]:
+            headers["If-None-Match"] = row[0]
+        if row[1]:
+            headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def get(self, url):
+        """
+        :return: `CachedResponse` of the url, to be used when the server answered 304. None when it's gone.
+        """
+        key = self.key(url)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, encoding FROM entries WHERE key = ?", (key, )).fetchone()
+            if row is None:
+                return None
+            try:
+                with gzip.open(self.path(key), "rb") as f:
+                    content = f.read()
+            except OSError:
+                self.delete(key)
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE entries SET used_at = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        headers = {name: value for name, value in (("ETag", row[0]), ("Last-Modified", row[1])) if value}
+        return CachedResponse(url, content, headers, row[2])
+
+    def put(self, url, content, headers, encoding=None):
+        """
+        Keeps the body of a 200 response when the server gave a validator for it.
+        """
+        etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        key = self.key(url)
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = "{}.{}.tmp".format(path, threading.get_ident())
+        with gzip.open(tmp, "wb") as f:
+            f.write(content)
+        size = os.path.getsize(tmp)
+        with self.lock:
+            os.replace(tmp, path)
+            self.stored += 1
+            row = self.conn.execute("SELECT size FROM entries WHERE key = ?", (key, )).fetchone()
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                  (key, url, etag, last_modified, encoding, size, time.time()))
+            self.size += size - (row[0] if row else 0)
+            self.evict()
+
+    def delete(self, key):
+        # To be called with the lock held.
+        row = self.conn.execute("SELECT size FROM entries WHERE key = ?", (key, )).fetchone()
+        with self.conn:
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key, ))
+        if row is not None:
+            self.size -= row[0]
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        # To be called with the lock held.
+        while self.size > self.max_bytes:
+            row = self.conn.execute("SELECT key FROM entries ORDER BY used_at LIMIT 1").fetchone()
+            if row is None:
+                break
+            self.delete(row[0])
+            self.evicted += 1
+
+    def close(self):
+        log.info("HTTP cache: {} served from cache on 304; {} stored; {} evicted; {:.1f} MB on disk".format(
+            self.hits, self.stored, self.evicted, self.size / 1024 / 1024))
+        self.conn.close()
@@ -3,55 +3,73 @@ import time
 import math
 import json
 import logging
-import requests
 import argparse
 import configparser
 from datetime import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
 
-import pandas as pd
-from bs4 import BeautifulSoup
 from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support import expected_conditions as EC
+
+import extract
+import cities
+import contacts
+from memo import Memo
+from cache import ProfileCache
+from httpcache import HttpCache
+from transport import Transport
+from archive import open_archive, replay
+from sinks import SINKS, open_sink, to_xlsx
 
 
 URL = "https://www.instagram.com"
+TAG_URL = re.compile(r"/explore/tags/([^/?]+)")
+POST_URL = re.compile(r"/p/([^/?]+)/")
 SCOPE = ('basic', 'public_content')
 log = logging.getLogger(__file__.split('/')[-1])
 
 
 class Instagram:
 
-    pattern_mobile = (
-        r"(\+91-)?(\+91)?([7-9]{1})([0-9]{9})",  # India
-        r"^\(?([0-9]{3})\)?[-.●]?([0-9]{3})[-.●]?([0-9]{4})$",  # North america (https://www.oreilly.com/library/view/regular-expressions-cookbook/9781449327453/ch04s02.html)
-        r"(([+][(]?[0-9]{1,3}[)]?)|([(]?[0-9]{4}[)]?))\s*[)]?[-\s\.]?[(]?[0-9]{1,3}[)]?([-\s\.]?[0-9]{3})([-\s\.]?[0-9]{3,4})",
-    )
-    pattern_email = (
-        r"([a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+)",
-    )
-
-    def __init__(self, tag, conf, cred):
+    def __init__(self, tag, conf, cred, sink, cache, transport, harvest="observer"):
         self.tag = tag
+        self.tags = [tag]
         self.conf = conf
         self.cred = cred
+        self.sink = sink
+        self.cache = cache
+        self.transport = transport
+        self.harvest = harvest
         self.chrome = webdriver.Chrome(self.conf["CHROME_DRIVER_PATH"])
         log.info("Chrome is started using chromedriver: {}".format(self.conf["CHROME_DRIVER_PATH"]))
 
         self.login()
         self.posts = set()
-        self.users = {}
+        self.owners = {}
+        self.post_tags = {}
+        self.users = set()
+        self.user_tags = {}
+        self.pending = []
+        self.profiles = Memo(self.get_profile)
+        self.latencies = []
 
     def login(self):
         self.chrome.get("https://www.instagram.com/accounts/login/")
-        time.sleep(3)
         try:
-            dom_username = self.chrome.find_element_by_xpath('//*[@name="username"]')
+            dom_username = WebDriverWait(self.chrome, 10).until(
+                EC.presence_of_element_located((By.XPATH, '//*[@name="username"]')))
             dom_password = self.chrome.find_element_by_xpath('//*[@name="password"]')
             dom_login_btn = self.chrome.find_element_by_xpath('//*[@type="submit"]')
 
             dom_username.send_keys(self.cred["USERNAME"])
             dom_password.send_keys(self.cred["PASSWORD"])
             dom_login_btn.click()
-            time.sleep(5)
+            WebDriverWait(self.chrome, 15).until(lambda chrome: "/accounts/login" not in chrome.current_url)
+        except TimeoutException:
+            log.error("Instagram didn't move past the login page. Please check the credentials in conf.ini")
         except BaseException as err:
             log.error("Error: ", err)
 
@@ -61,24 +79,53 @@ class Instagram:
         return math.ceil(1 + ((limit - 36) / 12))
 
     def load_posts(self):
-        source = self.chrome.execute_script("return document.documentElement.outerHTML")
-        # soup = BeautifulSoup(self.chrome.page_source, 'html.parser')
-        soup = BeautifulSoup(source, 'html.parser')
-        posts = self.get_posts(soup)
-        self.posts = self.posts.union(posts)
+        posts = extract.post_links(self.chrome, int(self.conf["LIMIT"]))
+        self.posts = self.posts.union("{}{}".format(URL, post) for post in posts)
+
+    def harvest_posts(self):
+        posts = extract.harvest(self.chrome)
+        self.posts.update("{}{}".format(URL, post) for post in posts)
+        log.debug("{} new posts harvested. Total: {}".format(len(posts), len(self.posts)))
+
+    def wait_for_posts(self, wait, state):
+        """
+        Waits until the page grows, new post links show up or `wait` seconds are over, whichever is first.
+
+        :param wait: ceiling in seconds.
+        :param state: page state (`extract.page_state`) before the scroll.
+        :return: seconds it took for the next batch to load, or None when the ceiling was hit.
+        """
+        start = time.time()
+        try:
+            WebDriverWait(self.chrome, wait, poll_frequency=0.1).until(
+                lambda chrome: extract.page_state(chrome) != state)
+            return time.time() - start
+        except TimeoutException:
+            return None
+
+    def log_latencies(self):
+        loaded = sorted(latency for latency in self.latencies if latency is not None)
+        if loaded:
+            log.info("Scroll load latency (s): min {:.2f}; median {:.2f}; max {:.2f}. {} of {} scrolls hit the "
+                     "ceiling.".format(loaded[0], loaded[len(loaded) // 2], loaded[-1],
+                                       len(self.latencies) - len(loaded), len(self.latencies)))
 
     def scroll_to_bottom(self):
-        limit, wait = self.get_scroll_limit(), int(self.conf["WAIT"])
+        limit, wait = self.get_scroll_limit(), float(self.conf["WAIT"])
         log.info("{} no. of pages has to be scrapped from Instagram".format(limit))
-        log.info("{} no. of seconds will be awaited for posts to be loaded on each scroll".format(wait))
+        log.info("Up to {} no. of seconds will be awaited for posts to be loaded on each scroll".format(wait))
 
+        load_posts = self.harvest_posts if self.harvest == "observer" else self.load_posts
         last_height = self.chrome.execute_script("return document.body.scrollHeight")
-        self.load_posts()
+        load_posts()
         count = 0
         while True:
+            state = extract.page_state(self.chrome)
             self.chrome.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(wait)
-            self.load_posts()
+            latency = self.wait_for_posts(wait, state)
+            self.latencies.append(latency)
+            log.debug("Posts loaded in {}".format("{:.2f}s".format(latency) if latency is not None else "over the ceiling"))
+            load_posts()
 
             # If the page reaches the bottom and no more posts to load
             new_height = self.chrome.execute_script("return document.body.scrollHeight")
@@ -94,15 +141,14 @@ class Instagram:
                 break
 
             log.info("Instagram page scrolled to page {}".format(count+1))
+        self.log_latencies()
 
-    def get_posts(self, soup):
-        posts = soup.article.contents[2].find_all("a", href=re.compile(r"^/p/.*"), limit=int(self.conf["LIMIT"]))
-        return set(["{}{}".format(URL, post.attrs["href"]) for post in posts])
+    def get_user_name(self, post):
+        return Instagram.get_post_owner(self.transport.get(post).text)
 
-    @classmethod
-    def get_user_name(cls, post):
-        html = requests.get(post).text
-        soup = BeautifulSoup(html, "html.parser")
+    @staticmethod
+    def get_post_owner(html):
+        soup = extract.soup(html, "script")
         data_json = str(soup.find_all("script", text=re.compile(r"^window._sharedData.*"))[0].string).replace(
             "window._sharedData = ", "").replace(";", "")
         data = json.loads(data_json)
@@ -110,62 +156,78 @@ class Instagram:
 
     @classmethod
     def get_user_email(cls, bio):
-        data = []
-        try:
-            for pattern in cls.pattern_email:
-                matches = re.findall(pattern, bio)
-                data.extend(matches)
-            return ", ".join(data)
-        except Exception as e:
-            print("\nPattern match failed")
-            print("bio: ", bio)
-            print("data: ", data, "\n")
-        return ""
+        return contacts.get_email(bio)
 
     @classmethod
     def get_user_phone(cls, bio):
-        data = set()
-        try:
-            for pattern in cls.pattern_mobile:
-                # matches = re.findall(pattern, bio)
-                matches = re.finditer(pattern, bio, re.MULTILINE)
-                for match in matches:
-                    data.add(match.group())
-            return ", ".join(list(data))
-        except Exception as e:
-            print("\nPattern match failed")
-            print("bio: ", bio)
-            print("data: ", data, "\n")
-        return ""
+        return contacts.get_phone(bio)
 
     @classmethod
     def get_user_gender(cls, bio):
-        if " female " in bio.lower():
-            return "Female"
-        elif " male " in bio.lower():
-            return "Male"
+        return contacts.get_gender(bio)
+
+    @staticmethod
+    def get_shortcode(post):
+        # Eg: https://www.instagram.com/p/B-6mHlTgGfT/ => B-6mHlTgGfT
+        return post.rstrip("/").rsplit("/", 1)[-1]
+
+    def get_owners(self):
+        """
+        Picks one post per distinct owner, so an owner is looked up once however many of the posts are theirs.
+
+        :return: `list` of (post, username, tags). The username is None when the hashtag edge had only the owner id, or
+                 no owner at all, and has to be read from the post itself. `tags` are all the tags the owner's posts
+                 were found under.
+        """
+        owners, seen = [], {}
+        for post in self.posts:
+            owner = self.owners.get(self.get_shortcode(post)) or {}
+            key = owner.get("id") or owner.get("username") or post
+            if key not in seen:
+                seen[key] = set()
+                owners.append((post, owner.get("username"), seen[key]))
+            seen[key].update(self.post_tags.get(post, ()))
+        log.info("{} posts are from {} distinct owners. {} of them are known by username".format(
+            len(self.posts), len(owners), sum(1 for _, username, _ in owners if username)))
+        return owners
+
+    def merge(self, other):
+        """
+        Takes in the posts another tag's scan found, so the owners of both are looked up together.
+
+        :param other: `Instagram` instance whose `get_posts` is over.
+        """
+        self.tags.append(other.tag)
+        self.posts.update(other.posts)
+        self.owners.update(other.owners)
+        for post, tags in other.post_tags.items():
+            self.post_tags.setdefault(post, set()).update(tags)
 
     def get_user_info(self, username):
         url = "{}/{}/?__a=1".format(URL, username)
         log.info("Fetching user info from url: {}".format(url))
 
         # Ignoring requests usage since it redirects the login page sometimes
-        response = requests.get(url)
+        response = self.transport.get(url)
         if response.status_code == 200:
             response = response.json()
         else:
             log.info("Can't get user info for {}. Status code: {}".format(username, response.status_code))
             return False
 
-        user = response["graphql"]["user"]
-        bio = user["biography"]
-        cls = Instagram
-
         # self.chrome.get(url)
         # time.sleep(0.5)
         # soup = BeautifulSoup(self.chrome.page_source, "html.parser")
         # response = json.loads(soup.body.pre.get_text())
 
+        return Instagram.get_user_row(response)
+
+    @staticmethod
+    def get_user_row(response):
+        user = response["graphql"]["user"]
+        bio = user["biography"]
+        cls = Instagram
+
         return {
             "name": u"{}".format(user["full_name"]),
             "username": user["username"],
@@ -175,37 +237,171 @@ class Instagram:
             "gender": cls.get_user_gender(bio),
             "email": cls.get_user_email(bio),
             "phone": cls.get_user_phone(bio),
-            "city": "",
+            "city": cities.get_city(bio),
             "biography": bio,
         }
 
-    def get_users(self):
+    @staticmethod
+    def parse_response(url, text):
+        """
+        Parses a recorded response for the replay.
+
+        :return: ("tag", tag, [(shortcode, username)]) of a tag's scan, ("post", shortcode, username) of a post page or
+                 ("profile", username, row) of a profile. None when it can't be parsed.
+        """
+        try:
+            match = TAG_URL.search(url)
+            if match:
+                data = json.loads(text)
+                shortcodes = map(Instagram.get_shortcode, data["posts"])
+                return "tag", match.group(1), [(code, (data["owners"].get(code) or {}).get("username"))
+                                               for code in shortcodes]
+            match = POST_URL.search(url)
+            if match:
+                return "post", match.group(1), Instagram.get_post_owner(text)
+            row = Instagram.get_user_row(json.loads(text))
+            return "profile", row["username"], row
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            log.error("Error parsing the recorded response of {}: {}".format(url, e))
+            return None
+
+    def get_profile(self, username):
+        """
+        :return: the user's row from the profile cache, or fetched with `get_user_info` when it isn't cached.
+        """
+        profile = self.cache.get(username)
+        if profile is None:
+            profile = self.get_user_info(username)
+            if profile:
+                self.cache.put(username, profile)
+        return profile
+
+    def get_posts(self):
         try:
             url = '{}/explore/tags/{}'.format(URL, self.tag)
             self.chrome.get(url)
             log.info("Started scrapping data from {}".format(url))
             log.info("Instagram page no 1 is initially loaded.")
+            extract.install_owner_tap(self.chrome)
             self.scroll_to_bottom()
-            log.info("{} no of posts has been fetched from Instagram. Scroll limit: {} pages".format(
-                len(self.posts), self.get_scroll_limit()))
+            self.owners = extract.owners(self.chrome)
+            for post in self.posts:
+                self.post_tags.setdefault(post, set()).add(self.tag)
+            if self.transport.archive is not None:
+                # The posts are harvested in the browser, so what the scan found is recorded in place of the pages.
+                self.transport.archive.record(url, json.dumps({"posts": sorted(self.posts), "owners": self.owners}),
+                                              "tag-posts")
+            log.info("{} no of posts has been fetched from #{}. Scroll limit: {} pages".format(
+                len(self.posts), self.tag, self.get_scroll_limit()))
+        finally:
+            self.chrome.close()
+        return self.posts
+
+    def save_user(self, username, info, tags):
+        """
+        Writes the user to the sink, once. With several tags the rows are held until every post is processed, so their
+        tags column has every tag the user was seen under.
+        """
+        if username in self.users:
+            # Two owner keys (Eg: an id-only edge and a post without owner) can turn out to be the same user.
+            self.user_tags[username].update(tags)
+            return
+        self.users.add(username)
+        self.user_tags[username] = set(tags)
+        if len(self.tags) == 1:
+            self.sink.write(dict(info, tags=", ".join(sorted(tags))))
+        else:
+            self.pending.append((username, info))
 
-            log.info("Started fetching the user information from scrapped posts.")
+    def save_pending(self):
+        for username, info in self.pending:
+            self.sink.write(dict(info, tags=", ".join(sorted(self.user_tags[username]))))
+        self.pending = []
+
+    def get_users(self):
+        log.info("Started fetching the user information from scrapped posts.")
+        try:
             # added for testing purpose. will remove it on moving to prod.
-            info = self.get_user_info("narensundaram.dev")
+            info = self.profiles("narensundaram.dev")
             if info:
-                self.users["narensundaram.dev"] = info
-            for post in self.posts:
-                username = self.get_user_name(post)
-                if username not in self.users:
-                    info = self.get_user_info(username)
-                    if info:
-                        self.users[username] = self.get_user_info(username)
-            log.info("{} no of users fetched from extracted posts on Instagram".format(len(self.users)))
-
-            df = pd.DataFrame(list(self.users.values()))
-            df.to_excel("users.xls", index=False)
+                self.save_user("narensundaram.dev", info, ())
+            for post, username, tags in self.get_owners():
+                username = username or self.get_user_name(post)
+                if username in self.users:
+                    self.user_tags[username].update(tags)
+                    continue
+                info = self.profiles(username)
+                if info:
+                    self.save_user(username, info, tags)
         finally:
-            self.chrome.close()
+            self.save_pending()
+        log.info("{} no of users fetched from extracted posts on Instagram".format(len(self.users)))
+        log.info("Profile lookups: {}".format(self.profiles.stats()))
+        return self.users
+
+
+def get_users(tags, conf, cred, sink, cache, transport, harvest="observer", browsers=2):
+    """
+    Scans the tags at the same time, each in its own browser, then looks up the owners of all their posts in one go.
+    A user found under several tags is fetched and saved once, with all of those tags.
+
+    :param tags: `list` of tag names.
+    :param browsers: max no. of browsers open at once.
+    :return: `set` of the usernames saved.
+    """
+    def scan(tag):
+        instagram = Instagram(tag=tag, conf=conf, cred=cred, sink=sink, cache=cache, transport=transport,
+                              harvest=harvest)
+        instagram.get_posts()
+        return instagram
+
+    with ThreadPoolExecutor(max_workers=max(1, min(browsers, len(tags)))) as executor:
+        scans = list(executor.map(scan, tags))
+    instagram = scans[0]
+    for other in scans[1:]:
+        instagram.merge(other)
+    return instagram.get_users()
+
+
+def read_archive(path, sink, processes=None):
+    """
+    Writes the users of the profiles recorded in the archive at `path` to the sink, with no browser or network. The
+    responses are parsed on `processes` cores; the tags column is rebuilt from the recorded scans and post pages.
+
+    :return: `set` of the usernames saved.
+    """
+    post_tags, post_owners, profiles = {}, {}, []
+    for url, parsed in replay(path, Instagram.parse_response, processes=processes):
+        if parsed is None:
+            continue
+        kind, key, value = parsed
+        if kind == "tag":
+            for post, username in value:
+                post_tags.setdefault(post, set()).add(key)
+                if username:
+                    post_owners.setdefault(post, username)
+        elif kind == "post":
+            post_owners[key] = value
+        else:
+            profiles.append((key, value))
+
+    user_tags = {}
+    for post, username in post_owners.items():
+        user_tags.setdefault(username, set()).update(post_tags.get(post, ()))
+    users = set()
+    for username, profile in profiles:
+        if username not in users:
+            users.add(username)
+            sink.write(dict(profile, tags=", ".join(sorted(user_tags.get(username, ())))))
+    log.info("{} users are replayed from {}".format(len(users), path))
+    return users
+
+
+def save(args, sink):
+    sink.close()
+    log.info("{} users are saved to {}".format(sink.count, sink.path))
+    if args.xlsx:
+        to_xlsx(sink.path, "users.xlsx")
 
 
 def get_conf():
@@ -222,10 +418,35 @@ def get_insta_cred():
 
 def get_args():
     arg_parser = argparse.ArgumentParser()
-    arg_parser.add_argument('-t', '--tag', type=str, default="streetbrand",
-                            help='Enter the tag-name (Eg: streetbrand) to scrap from Instagram.')
+    arg_parser.add_argument('-t', '--tag', type=str, nargs="+", default=["streetbrand"],
+                            help='Enter one or more tag-names (Eg: streetbrand streetwear) to scrap from Instagram.')
+    arg_parser.add_argument('-browsers', '--browsers', type=int, default=2,
+                            help='No. of tags scanned at once, each in its own browser.')
     arg_parser.add_argument('-log-level', '--log_level', type=str, choices=("INFO", "DEBUG"),
                             default="INFO", help='Where do you want to post the info?')
+    arg_parser.add_argument('-harvest', '--harvest', type=str, choices=("observer", "full"), default="observer",
+                            help='Collect only the posts added since the last scroll, or re-read all of them.')
+    arg_parser.add_argument('-cache', '--cache', type=str, default="profiles.db",
+                            help='SQLite file the scraped users are kept in across runs.')
+    arg_parser.add_argument('-ttl', '--ttl', type=float, default=7,
+                            help='No. of days a cached user is reused before it is fetched again.')
+    arg_parser.add_argument('-cache-dir', '--cache-dir', '--cache_dir', type=str, default="http_cache",
+                            help='Directory the responses are cached in and revalidated from with conditional '
+                                 'requests.')
+    arg_parser.add_argument('-cache-size', '--cache-size', '--cache_size', type=int, default=200,
+                            help='Max. MB of responses kept in --cache_dir. The least recently used go first.')
+    arg_parser.add_argument('-record', '--record', type=str, default=None,
+                            help='Archive every response fetched and every scan to this file. Eg: insta.warc.gz')
+    arg_parser.add_argument('-replay', '--replay', type=str, default=None,
+                            help='Read the users from the responses recorded in this archive instead of Instagram.')
+    arg_parser.add_argument('-processes', '--processes', type=int, default=None,
+                            help='No. of processes parsing the responses with --replay (Default: one per core).')
+    arg_parser.add_argument('-sink', '--sink', type=str, choices=tuple(SINKS), default="csv",
+                            help='Format the users are streamed to while scraping.')
+    arg_parser.add_argument('-batch-size', '--batch_size', type=int, default=20,
+                            help='No. of users held in memory before they are written to the sink.')
+    arg_parser.add_argument('-xlsx', '--xlsx', action="store_true",
+                            help='Build users.xlsx from the sink once the scraping is over.')
     return arg_parser.parse_args()
 
 
@@ -252,9 +473,27 @@ def main():
 
     start = dt.now().strftime("%d-%m-%Y %H:%M:%S %p")
     log.info("Script starts at: {}".format(start))
-    log.info("Tag name: '{}' is given to fetch from Instagram".format(args.tag))
+    tags = list(dict.fromkeys(tag.lower().lstrip("#") for tag in args.tag))
+    log.info("Tag names: {} are given to fetch from Instagram".format(", ".join("'{}'".format(tag) for tag in tags)))
 
-    Instagram(tag=args.tag.lower(), conf=conf, cred=cred).get_users()
+    sink = open_sink(args.sink, "users", batch_size=args.batch_size)
+    if args.replay:
+        try:
+            read_archive(args.replay, sink, processes=args.processes)
+        finally:
+            save(args, sink)
+    else:
+        # Cached users never reach the transport, so they'd be missing from the archive. Every user is fetched anew.
+        cache = ProfileCache(args.cache, ttl=0 if args.record else args.ttl * 24 * 60 * 60)
+        transport = Transport(cache=HttpCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024),
+                              archive=open_archive(args.record))
+        try:
+            get_users(tags, conf=conf, cred=cred, sink=sink, cache=cache, transport=transport, harvest=args.harvest,
+                      browsers=args.browsers)
+        finally:
+            save(args, sink)
+            cache.close()
+            transport.close()
 
     end = dt.now().strftime("%d-%m-%Y %H:%M:%S %p")
     log.info("Script ends at: {}".format(end))
@@ -1,85 +1,65 @@
 import re
 import time
 import json
+import queue
+import asyncio
 import logging
-import requests
 import argparse
 import configparser
 from datetime import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
 
-import pandas as pd
+import cities
+import contacts
+from memo import Memo, AsyncMemo
+from archive import open_archive, replay
+from cache import ProfileCache
+from httpcache import HttpCache
+from transport import Transport, AsyncTransport
+from sinks import SINKS, open_sink, to_xlsx
 
 
 URL = "https://www.instagram.com"
 SCOPE = ('basic', 'public_content')
+TAG_URL = re.compile(r"/explore/tags/([^/]+)/\?__a=1")
+POST_URL = re.compile(r"/p/([^/]+)/\?__a=1")
 log = logging.getLogger(__file__.split('/')[-1])
 
 
 class Instagram:
 
-    pattern_email = (
-        r"([a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+)",
-    )
-
-    pattern_mobile = (
-        # India
-        r"(\+91-)?(\+91)?([7-9]{1})([0-9]{9})",
-
-        # North america (https://www.oreilly.com/library/view/regular-expressions-cookbook/9781449327453/ch04s02.html)
-        r"^\(?([0-9]{3})\)?[-.●]?([0-9]{3})[-.●]?([0-9]{4})$",
-
-        # General
-        r"(([+][(]?[0-9]{1,3}[)]?)|([(]?[0-9]{4}[)]?))\s*[)]?[-\s\.]?[(]?[0-9]{1,3}[)]?([-\s\.]?[0-9]{3})([-\s\.]?[0-9]{3,4})",
-    )
-
-    def __init__(self, tag, conf):
-        self.tag = tag
+    def __init__(self, tags, conf, sink, cache, transport, engine="serial", concurrency=10):
+        self.tags = tags
         self.conf = conf
-
-        self.posts = set()
-        self.users = {}
+        self.sink = sink
+        self.cache = cache
+        self.transport = transport
+        self.engine = engine
+        self.concurrency = concurrency
+
+        self.posts = {}
+        self.post_tags = {}
+        self.owners = {}
+        self.users = set()
+        self.user_tags = {}
+        self.pending = []
+        self.profiles = Memo(self.get_profile)
 
     @classmethod
     def get_user_email(cls, bio):
-        data = []
-        try:
-            for pattern in cls.pattern_email:
-                matches = re.findall(pattern, bio)
-                data.extend(matches)
-            return ", ".join(data)
-        except Exception as e:
-            log.info("\nPattern match failed")
-            log.info("bio: {}".format(bio))
-            log.info("data: {}\n".format(data))
-        return ""
+        return contacts.get_email(bio)
 
     @classmethod
     def get_user_phone(cls, bio):
-        data = set()
-        try:
-            for pattern in cls.pattern_mobile:
-                # matches = re.findall(pattern, bio)
-                matches = re.finditer(pattern, bio, re.MULTILINE)
-                for match in matches:
-                    data.add(match.group())
-            return ", ".join(list(data))
-        except Exception as e:
-            log.info("\nPattern match failed")
-            log.info("bio: {}".format(bio))
-            log.info("data: {}\n".format(data))
-        return ""
+        return contacts.get_phone(bio)
 
-    @staticmethod
-    def get_user_gender(bio):
-        if " female " in bio.lower():
-            return "Female"
-        elif " male " in bio.lower():
-            return "Male"
+    @classmethod
+    def get_user_gender(cls, bio):
+        return contacts.get_gender(bio)
 
-    @staticmethod
-    def get_post(code):
+    def get_post(self, code):
         url = "{}/p/{}/?__a=1".format(URL, code)
-        response = requests.get(url)
+        response = self.transport.get(url)
         if response.status_code == 200:
             try:
                 return response.json()
@@ -88,11 +68,10 @@ class Instagram:
                 # log.exception("\nException: \n{}\n".format(response.text))
         return False
 
-    @staticmethod
-    def get_user(username):
+    def get_user(self, username):
         url = "{}/{}/?__a=1".format(URL, username)
         log.debug("Fetching user info from url: {}".format(url))
-        response = requests.get(url)
+        response = self.transport.get(url)
         if response.status_code == 200:
             try:
                 return response.json()
@@ -101,75 +80,397 @@ class Instagram:
                 # log.exception("\nException: \n{}\n".format(response.text))
         return False
 
+    @staticmethod
+    def get_post_owner(post_info):
+        return post_info["graphql"]["shortcode_media"]["owner"]["username"]
+
+    @staticmethod
+    def get_edge_owner(node):
+        owner = node.get("owner") or {}
+        return {key: owner[key] for key in ("id", "username") if owner.get(key)}
+
+    def add_post(self, post, owner, tag):
+        """
+        Takes in a post as it's found. Posts are reduced to one per distinct owner, so an owner is looked up once
+        however many of the posts are theirs.
+
+        :return: (shortcode, username, tags) when it's the first post of its owner, else None. The username is None
+                 when the hashtag edge had only the owner id, or no owner at all, and has to be read from the post
+                 itself. `tags` keeps collecting every tag the owner's posts are found under.
+        """
+        self.posts.setdefault(post, owner)
+        self.post_tags.setdefault(post, set()).add(tag)
+        key = owner.get("id") or owner.get("username") or post
+        if key in self.owners:
+            self.owners[key].add(tag)
+            return None
+        self.owners[key] = {tag}
+        return post, owner.get("username"), self.owners[key]
+
+    def save_user(self, username, profile, tags):
+        """
+        Writes the user to the sink, once. With several tags the rows are held until the scans are over, so their tags
+        column has every tag the user was seen under.
+        """
+        if username in self.users:
+            self.user_tags[username].append(tags)
+            return
+        self.users.add(username)
+        self.user_tags[username] = [tags]
+        if len(self.tags) == 1:
+            self.sink.write(Instagram.get_tagged_row(profile, tags))
+        else:
+            self.pending.append((username, profile))
+        if len(self.users) % 10 == 0:
+            log.info("{} no of users added so far ...".format(len(self.users)))
+
+    def save_pending(self):
+        for username, profile in self.pending:
+            self.sink.write(Instagram.get_tagged_row(profile, set().union(*self.user_tags[username])))
+        self.pending = []
+
+    @staticmethod
+    def get_tagged_row(profile, tags):
+        return dict(profile, tags=", ".join(sorted(tags)))
+
+    @staticmethod
+    def get_user_row(user):
+        info = user["graphql"]["user"]
+        bio = info["biography"]
+        return {
+            "name": u"{}".format(info["full_name"]),
+            "username": info["username"],
+            "count_followers": info["edge_followed_by"]["count"],
+
+            # To fetch it from user["biography"] using regex
+            "gender": Instagram.get_user_gender(bio),
+            "email": Instagram.get_user_email(bio),
+            "phone": Instagram.get_user_phone(bio),
+            "city": cities.get_city(bio),
+            "biography": bio,
+        }
+
+    @staticmethod
+    def parse_response(url, text):
+        """
+        Parses a recorded response for the replay.
+
+        :return: ("tag", tag, [(shortcode, username)]) of a hashtag page, ("post", shortcode, username) of a post or
+                 ("profile", username, row) of a profile. None when it can't be parsed.
+        """
+        try:
+            data = json.loads(text)
+            match = TAG_URL.search(url)
+            if match:
+                edges = data['graphql']['hashtag']['edge_hashtag_to_media']['edges']
+                return "tag", match.group(1), [(item['node']["shortcode"],
+                                                Instagram.get_edge_owner(item['node']).get("username"))
+                                               for item in edges]
+            match = POST_URL.search(url)
+            if match:
+                return "post", match.group(1), Instagram.get_post_owner(data)
+            row = Instagram.get_user_row(data)
+            return "profile", row["username"], row
+        except (ValueError, KeyError, TypeError) as e:
+            log.error("Error parsing the recorded response of {}: {}".format(url, e))
+            return None
+
+    def get_profile(self, username):
+        """
+        :return: the user's row from the profile cache, or fetched and parsed when it isn't cached. False on failure.
+        """
+        profile = self.cache.get(username)
+        if profile is None:
+            user = self.get_user(username)
+            if not user:
+                return False
+            profile = Instagram.get_user_row(user)
+            self.cache.put(username, profile)
+        return profile
+
     def get_users(self):
-        users = {}
-        count = 0
-
-        for post in self.posts:
-            post_info = Instagram.get_post(post)
-            if post_info:
-                username = post_info["graphql"]["shortcode_media"]["owner"]["username"]
-                if username not in users:
-                    user = Instagram.get_user(username)
-                    if user:
-                        count += 1
-
-                        info = user["graphql"]["user"]
-                        bio = info["biography"]
-                        users[username] = {
-                            "name": u"{}".format(info["full_name"]),
-                            "username": info["username"],
-                            "count_followers": info["edge_followed_by"]["count"],
-
-                            # To fetch it from user["biography"] using regex
-                            "gender": Instagram.get_user_gender(bio),
-                            "email": Instagram.get_user_email(bio),
-                            "phone": Instagram.get_user_phone(bio),
-                            "city": "",
-                            "biography": bio,
-                        }
-                    if count and count % 10 == 0:
-                        log.info("{} no of users added so far ...".format(count))
-        # time.sleep(0.5)
-        self.users = users
+        """
+        Looks up the owners of the posts while the tags are still being paged through, so the first users come in
+        after the first page instead of after the last one.
+        """
+        if self.engine == "async":
+            AsyncUserFetcher(self, concurrency=self.concurrency).read()
+            return self.users
+
+        try:
+            for post, username, tags in filter(None, (self.add_post(*item) for item in self.get_posts())):
+                if username is None:
+                    post_info = self.get_post(post)
+                    username = Instagram.get_post_owner(post_info) if post_info else None
+                if username in self.users:
+                    self.user_tags[username].append(tags)
+                elif username:
+                    profile = self.profiles(username)
+                    if profile:
+                        self.save_user(username, profile, tags)
+            # time.sleep(0.5)
+        finally:
+            # The users held back for their tags are written even when a scan broke off midway.
+            self.save_pending()
+        log.info("Profile lookups: {}".format(self.profiles.stats()))
         return self.users
 
-    def get_posts(self):
-        posts = set()
-        end_cursor = ''
-        count = 1
-        while True:
-            url = "{}/explore/tags/{}/?__a=1&max_id={}".format(URL, self.tag, end_cursor)
-            r = requests.get(url)
-            data = json.loads(r.text)
+    def get_page(self, tag, end_cursor):
+        url = "{}/explore/tags/{}/?__a=1&max_id={}".format(URL, tag, end_cursor)
+        r = self.transport.get(url)
+        if r.status_code != 200:
+            log.debug("Status code: {} from {}".format(r.status_code, url))
+            return None
+        try:
+            return json.loads(r.text)['graphql']['hashtag']['edge_hashtag_to_media']
+        except (ValueError, KeyError, TypeError) as e:
+            log.error("Error parsing {}: {}".format(url, e))
+            return None
 
-            end_cursor = data['graphql']['hashtag']['edge_hashtag_to_media']['page_info'][
-                'end_cursor']  # value for the next page
-            edges = data['graphql']['hashtag']['edge_hashtag_to_media']['edges']
+    @staticmethod
+    def get_next_cursor(media, count, limit):
+        """
+        :return: end_cursor of the next page, or None once the tag has no more pages or `limit` posts are seen.
+        """
+        page_info = media['page_info']
+        if not page_info.get('has_next_page') or not page_info.get('end_cursor') or count >= limit:
+            return None
+        return page_info['end_cursor']  # value for the next page
+
+    def get_tag_posts(self, tag):
+        """
+        Yields (shortcode, owner) of the tag's recent posts page by page. The next page is requested while the
+        current one is being processed.
+        """
+        seen, count = set(), 1
+        limit = int(self.conf["LIMIT"])
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            page = executor.submit(self.get_page, tag, '')
+            while page is not None:
+                media = page.result()
+                if media is None:
+                    break
+                edges = media['edges']
+                seen.update(item['node']["shortcode"] for item in edges)
+                end_cursor = Instagram.get_next_cursor(media, len(seen), limit)
+                page = executor.submit(self.get_page, tag, end_cursor) if end_cursor else None
+
+                log.info("#{}: Instagram page scrolled to page {}. Loaded {} no of posts".format(tag, count, len(seen)))
+                count += 1
+                for item in edges:
+                    yield item['node']["shortcode"], Instagram.get_edge_owner(item['node'])
+                # time.sleep(2)
 
-            for item in edges:
-                posts.add(item['node']["shortcode"])
+    def get_posts(self):
+        """
+        Yields (shortcode, owner, tag) of every tag's posts as they are paged through, with the tags paged at once.
+        """
+        if len(self.tags) == 1:
+            for post, owner in self.get_tag_posts(self.tags[0]):
+                yield post, owner, self.tags[0]
+            return
 
-            log.info("Instagram page scrolled to page {}. Loaded {} no of posts".format(count, len(posts)))
-            count += 1
-            if len(posts) >= int(self.conf["LIMIT"]):
-                break
+        posts = queue.Queue()
 
-            # time.sleep(2)
-        self.posts = posts
-        return self.posts
+        def scan(tag):
+            try:
+                for post, owner in self.get_tag_posts(tag):
+                    posts.put((post, owner, tag))
+            finally:
+                posts.put(None)
+
+        with ThreadPoolExecutor(max_workers=len(self.tags)) as executor:
+            scans = [executor.submit(scan, tag) for tag in self.tags]
+            running = len(scans)
+            while running:
+                item = posts.get()
+                if item is None:
+                    running -= 1
+                else:
+                    yield item
+            for done in scans:
+                done.result()
 
     def get(self):
-        log.info("Started getting the recent posts from Instagram.")
-        posts = self.get_posts()
-        log.info("*** {} no of posts has been fetched from Instagram ***".format(len(posts)))
-
-        log.info("Started getting the users from extracted posts in Instagram.")
+        log.info("Started getting the users from the recent posts in Instagram.")
         users = self.get_users()
+        log.info("*** {} no of posts has been fetched from Instagram ***".format(len(self.posts)))
         log.info("*** {} no of users has been fetched from Instagram ***".format(len(users)))
 
-        df = pd.DataFrame(list(users.values()))
-        df.to_excel("users.xls", index=False)
+
+class AsyncUserFetcher(object):
+    """
+    Pages through the tags and looks up the posts and their owners over one `AsyncTransport`, with at most
+    `concurrency` requests in flight.
+
+    Every tag is paged through with its next page requested while the current one is processed. A post's owner is
+    looked up as soon as the post is found, and handed to a queue the owner's profile is requested from, while the
+    remaining posts are still being fetched. Owners already known from the hashtag edges go to the queue without a post
+    lookup. Users are saved in the order their owners were found, the same as `Instagram.get_users` does in serial
+    mode.
+    """
+
+    def __init__(self, instagram, concurrency=10, timeout=30):
+        self.instagram = instagram
+        self.cache = instagram.cache
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.profiles = None
+        self.transport = None
+
+    async def fetch_json(self, url):
+        status, text = await self.transport.get(url)
+        if status != 200:
+            log.debug("Status code: {} from {}".format(status, url))
+            return False
+        try:
+            return json.loads(text)
+        except ValueError as e:
+            log.error("Error parsing {}: {}".format(url, e))
+            return False
+
+    async def get_page(self, tag, end_cursor):
+        url = "{}/explore/tags/{}/?__a=1&max_id={}".format(URL, tag, end_cursor)
+        data = await self.fetch_json(url)
+        return data['graphql']['hashtag']['edge_hashtag_to_media'] if data else None
+
+    async def get_tag_posts(self, tag, posts):
+        seen, count = set(), 1
+        limit = int(self.instagram.conf["LIMIT"])
+        try:
+            page = asyncio.ensure_future(self.get_page(tag, ''))
+            while page is not None:
+                media = await page
+                if media is None:
+                    break
+                edges = media['edges']
+                seen.update(item['node']["shortcode"] for item in edges)
+                end_cursor = Instagram.get_next_cursor(media, len(seen), limit)
+                page = asyncio.ensure_future(self.get_page(tag, end_cursor)) if end_cursor else None
+
+                log.info("#{}: Instagram page scrolled to page {}. Loaded {} no of posts".format(tag, count, len(seen)))
+                count += 1
+                for item in edges:
+                    await posts.put((item['node']["shortcode"], Instagram.get_edge_owner(item['node']), tag))
+        finally:
+            await posts.put(None)
+
+    async def get_owner(self, queue, post, username, tags):
+        if username is None:
+            post_info = await self.fetch_json("{}/p/{}/?__a=1".format(URL, post))
+            username = Instagram.get_post_owner(post_info) if post_info else None
+        # None is the end of the queue to `get_profiles`, so a failed lookup isn't prefetched at all.
+        if username is not None:
+            await queue.put(username)
+        return username, tags
+
+    async def get_owners(self, posts, usernames, lookups):
+        scans, pending = len(self.instagram.tags), []
+        while scans:
+            item = await posts.get()
+            if item is None:
+                scans -= 1
+                continue
+            owner = self.instagram.add_post(*item)
+            if owner is not None:
+                lookup = asyncio.ensure_future(self.get_owner(usernames, *owner))
+                pending.append(lookup)
+                await lookups.put(lookup)
+        await lookups.put(None)
+        await asyncio.gather(*pending)
+        await usernames.put(None)
+
+    async def get_profile(self, username):
+        profile = self.cache.get(username)
+        if profile is None:
+            log.debug("Fetching user info of: {}".format(username))
+            user = await self.fetch_json("{}/{}/?__a=1".format(URL, username))
+            if not user:
+                return False
+            profile = Instagram.get_user_row(user)
+            self.cache.put(username, profile)
+        return profile
+
+    async def get_profiles(self, queue):
+        while True:
+            username = await queue.get()
+            if username is None:
+                break
+            asyncio.ensure_future(self.profiles(username))
+
+    async def fetch_all(self):
+        instagram = self.instagram
+        transport = AsyncTransport(concurrency=self.concurrency, timeout=self.timeout, cache=instagram.transport.cache,
+                                   archive=instagram.transport.archive)
+        async with transport as self.transport:
+            posts, usernames, lookups = asyncio.Queue(), asyncio.Queue(), asyncio.Queue()
+            self.profiles = AsyncMemo(self.get_profile)
+            stages = [asyncio.ensure_future(self.get_tag_posts(tag, posts)) for tag in instagram.tags]
+            stages.append(asyncio.ensure_future(self.get_owners(posts, usernames, lookups)))
+            stages.append(asyncio.ensure_future(self.get_profiles(usernames)))
+
+            while True:
+                lookup = await lookups.get()
+                if lookup is None:
+                    break
+                username, tags = await lookup
+                if username in instagram.users:
+                    instagram.user_tags[username].append(tags)
+                elif username:
+                    profile = await self.profiles(username)
+                    if profile:
+                        instagram.save_user(username, profile, tags)
+            await asyncio.gather(*stages)
+        instagram.save_pending()
+        log.info("Profile lookups: {}".format(self.profiles.stats()))
+        return instagram.users
+
+    def read(self):
+        """
+        :return: `set` of the usernames saved.
+        """
+        return asyncio.run(self.fetch_all())
+
+
+def read_archive(path, sink, processes=None):
+    """
+    Writes the users of the profiles recorded in the archive at `path` to the sink, with no network. The responses
+    are parsed on `processes` cores; the tags column is rebuilt from the recorded hashtag pages and posts.
+
+    :return: `set` of the usernames saved.
+    """
+    post_tags, post_owners, profiles = {}, {}, []
+    for url, parsed in replay(path, Instagram.parse_response, kind="response", processes=processes):
+        if parsed is None:
+            continue
+        kind, key, value = parsed
+        if kind == "tag":
+            for post, username in value:
+                post_tags.setdefault(post, set()).add(key)
+                if username:
+                    post_owners.setdefault(post, username)
+        elif kind == "post":
+            post_owners[key] = value
+        else:
+            profiles.append((key, value))
+
+    user_tags = {}
+    for post, username in post_owners.items():
+        user_tags.setdefault(username, set()).update(post_tags.get(post, ()))
+    users = set()
+    for username, profile in profiles:
+        if username not in users:
+            users.add(username)
+            sink.write(Instagram.get_tagged_row(profile, user_tags.get(username, ())))
+    log.info("{} users are replayed from {}".format(len(users), path))
+    return users
+
+
+def save(args, sink):
+    sink.close()
+    log.info("{} users are saved to {}".format(sink.count, sink.path))
+    if args.xlsx:
+        to_xlsx(sink.path, "users.xlsx")
 
 
 def get_conf():
@@ -180,10 +481,35 @@ def get_conf():
 
 def get_args():
     arg_parser = argparse.ArgumentParser()
-    arg_parser.add_argument('-t', '--tag', type=str, default="streetbrand",
-                            help='Enter the tag-name (Eg: streetbrand) to scrap from Instagram.')
+    arg_parser.add_argument('-t', '--tag', type=str, nargs="+", default=["streetbrand"],
+                            help='Enter one or more tag-names (Eg: streetbrand streetwear) to scrap from Instagram.')
     arg_parser.add_argument('-log-level', '--log_level', type=str, choices=("INFO", "DEBUG"),
                             default="INFO", help='Where do you want to post the info?')
+    arg_parser.add_argument('-engine', '--engine', type=str, choices=("serial", "async"), default="serial",
+                            help='Look up the posts and users one at a time or concurrently.')
+    arg_parser.add_argument('-concurrency', '--concurrency', type=int, default=10,
+                            help='No. of requests in flight with the async engine.')
+    arg_parser.add_argument('-cache', '--cache', type=str, default="profiles.db",
+                            help='SQLite file the scraped users are kept in across runs.')
+    arg_parser.add_argument('-ttl', '--ttl', type=float, default=7,
+                            help='No. of days a cached user is reused before it is fetched again.')
+    arg_parser.add_argument('-cache-dir', '--cache-dir', '--cache_dir', type=str, default="http_cache",
+                            help='Directory the responses are cached in and revalidated from with conditional '
+                                 'requests.')
+    arg_parser.add_argument('-cache-size', '--cache-size', '--cache_size', type=int, default=200,
+                            help='Max. MB of responses kept in --cache_dir. The least recently used go first.')
+    arg_parser.add_argument('-record', '--record', type=str, default=None,
+                            help='Archive every response fetched to this file. Eg: instagram.warc.gz')
+    arg_parser.add_argument('-replay', '--replay', type=str, default=None,
+                            help='Read the users from the responses recorded in this archive instead of Instagram.')
+    arg_parser.add_argument('-processes', '--processes', type=int, default=None,
+                            help='No. of processes parsing the responses with --replay (Default: one per core).')
+    arg_parser.add_argument('-sink', '--sink', type=str, choices=tuple(SINKS), default="csv",
+                            help='Format the users are streamed to while scraping.')
+    arg_parser.add_argument('-batch-size', '--batch_size', type=int, default=20,
+                            help='No. of users held in memory before they are written to the sink.')
+    arg_parser.add_argument('-xlsx', '--xlsx', action="store_true",
+                            help='Build users.xlsx from the sink once the scraping is over.')
     return arg_parser.parse_args()
 
 
@@ -209,9 +535,27 @@ def main():
 
     start = dt.now().strftime("%d-%m-%Y %H:%M:%S %p")
     log.info("Script starts at: {}".format(start))
-    log.info("Tag name: '{}' is given to fetch from Instagram".format(args.tag))
+    tags = list(dict.fromkeys(tag.lower().lstrip("#") for tag in args.tag))
+    log.info("Tag names: {} are given to fetch from Instagram".format(", ".join("'{}'".format(tag) for tag in tags)))
 
-    Instagram(tag=args.tag.lower(), conf=conf).get()
+    sink = open_sink(args.sink, "users", batch_size=args.batch_size)
+    if args.replay:
+        try:
+            read_archive(args.replay, sink, processes=args.processes)
+        finally:
+            save(args, sink)
+    else:
+        # Cached users never reach the transport, so they'd be missing from the archive. Every user is fetched anew.
+        cache = ProfileCache(args.cache, ttl=0 if args.record else args.ttl * 24 * 60 * 60)
+        transport = Transport(cache=HttpCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024),
+                              archive=open_archive(args.record))
+        try:
+            Instagram(tags=tags, conf=conf, sink=sink, cache=cache, transport=transport, engine=args.engine,
+                      concurrency=args.concurrency).get()
+        finally:
+            save(args, sink)
+            cache.close()
+            transport.close()
 
     end = dt.now().strftime("%d-%m-%Y %H:%M:%S %p")
     log.info("Script ends at: {}".format(end))
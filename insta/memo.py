@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+
+class Flight(object):
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Memo(object):
+    """
+    Remembers the last `maxsize` results of `fn` by its argument. A call for a key that is already being fetched by
+    another thread waits for that call instead of making the same request again.
+
+    Only results passing `keep` are remembered (Eg: keep=bool leaves out a failed lookup returning False), so a
+    failure is tried again the next time the key comes up.
+    """
+
+    def __init__(self, fn, maxsize=1024, keep=bool):
+        self.fn = fn
+        self.maxsize = maxsize
+        self.keep = keep
+        self.results = OrderedDict()
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.shared = 0
+
+    def lookup(self, key):
+        # To be called with the lock held. Returns (found, result).
+        if key in self.results:
+            self.results.move_to_end(key)
+            self.hits += 1
+            return True, self.results[key]
+        return False, None
+
+    def remember(self, key, result):
+        if self.keep(result):
+            self.results[key] = result
+            if len(self.results) > self.maxsize:
+                self.results.popitem(last=False)
+
+    def __call__(self, key):
+        with self.lock:
+            found, result = self.lookup(key)
+            if found:
+                return result
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self.fn(key)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                if flight.error is None:
+                    self.remember(key, flight.result)
+                del self.flights[key]
+            flight.event.set()
+
+    def stats(self):
+        total = self.hits + self.misses + self.shared
+        saved = self.hits + self.shared
+        return "{} lookups; {} fetched; {} served from memory; {} joined a request in flight ({:.1f}% saved)".format(
+            total, self.misses, self.hits, self.shared, 100.0 * saved / total if total else 0.0)
+
+
+class AsyncMemo(Memo):
+    """
+    `Memo` for a coroutine function, on a single event loop. Calls for a key in flight await the same task.
+    """
+
+    async def __call__(self, key):
+        found, result = self.lookup(key)
+        if found:
+            return result
+        task = self.flights.get(key)
+        if task is None:
+            self.misses += 1
+            task = self.flights[key] = asyncio.ensure_future(self.fn(key))
+            task.add_done_callback(lambda done: self.land(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def land(self, key, task):
+        del self.flights[key]
+        if not task.cancelled() and task.exception() is None:
+            self.remember(key, task.result())
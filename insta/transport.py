@@ -0,0 +1,298 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+THROTTLE_STATUSES = (429, 503)
+
+
+class HostLimiter(object):
+    """
+    AIMD limit of the requests in flight to one host. Every healthy response raises the limit by 1/limit, so about
+    one more request per round of responses, and a throttled one halves it and holds the host back for `delay`
+    seconds (the Retry-After of the response when it gives one).
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=32):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.active = 0
+        self.not_before = 0.0
+
+    def wait_time(self):
+        return max(0.0, self.not_before - time.time())
+
+    def can_start(self):
+        return self.active < int(self.limit) and not self.wait_time()
+
+    def success(self):
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def throttled(self, delay):
+        self.limit = max(self.minimum, self.limit / 2)
+        self.not_before = max(self.not_before, time.time() + delay)
+
+
+class Stats(object):
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.requests = 0
+        self.responses = 0
+        self.retries = 0
+        self.throttled = 0
+        self.errors = 0
+
+    def rate(self):
+        """
+        :return: no. of requests sent per second since the transport was created.
+        """
+        return self.requests / max(time.time() - self.started_at, 1e-6)
+
+    def summary(self):
+        return "{} requests ({:.2f}/s); {} responses; {} retries; {} throttled; {} errors".format(
+            self.requests, self.rate(), self.responses, self.retries, self.throttled, self.errors)
+
+
+class BaseTransport(object):
+
+    def __init__(self, retries=3, backoff=1.0, timeout=30, initial=4, maximum=32, cache=None, archive=None):
+        self.retries = retries
+        self.cache = cache
+        self.archive = archive
+        self.backoff = backoff
+        self.timeout = timeout
+        self.initial = initial
+        self.maximum = maximum
+        self.hosts = {}
+        self.stats = Stats()
+
+    def get_limiter(self, url):
+        host = urlsplit(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = HostLimiter(self.initial, maximum=self.maximum)
+        return self.hosts[host]
+
+    def get_delay(self, attempt, headers=None):
+        # Full jitter, so the workers backing off at once don't all come back at once.
+        delay = random.uniform(0, self.backoff * 2 ** attempt)
+        retry_after = (headers or {}).get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    def land(self, limiter, status, headers=None):
+        # To be called with the limiter released. Returns whether the request is worth another attempt.
+        if status is None:
+            self.stats.errors += 1
+        else:
+            self.stats.responses += 1
+        if status in THROTTLE_STATUSES:
+            self.stats.throttled += 1
+            limiter.throttled(self.get_delay(0, headers))
+        elif status is not None and status < 500:
+            limiter.success()
+        return status is None or status in RETRY_STATUSES
+
+    def limits(self):
+        """
+        :return: `dict` of host => current limit of requests in flight.
+        """
+        return {host: int(limiter.limit) for host, limiter in self.hosts.items()}
+
+    def record(self, url, body, headers):
+        if self.archive is not None:
+            self.archive.record(url, body, "response", content_type=headers.get("Content-Type", ""))
+
+
+class Transport(BaseTransport):
+    """
+    One pooled requests session shared by every lookup. A request answered with 429/5xx, or not answered at all, is
+    retried up to `retries` times with jittered exponential backoff, and every host gets its own `HostLimiter`.
+    Threads calling `get` at once wait for their host's limit.
+
+    With an `HttpCache`, requests for cached urls are sent conditionally and a 304 is answered from the cache. With an
+    `Archive`, the body of every 200 (or 304 answered from the cache) is recorded to it.
+    """
+
+    def __init__(self, retries=3, backoff=1.0, timeout=30, initial=4, maximum=32, pool_size=32, cache=None,
+                 archive=None):
+        super(Transport, self).__init__(retries, backoff, timeout, initial, maximum, cache, archive)
+        self.condition = threading.Condition()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def acquire(self, limiter):
+        with self.condition:
+            while not limiter.can_start():
+                self.condition.wait(timeout=limiter.wait_time() or 0.1)
+            limiter.active += 1
+            self.stats.requests += 1
+
+    def release(self, limiter, status, headers=None):
+        with self.condition:
+            limiter.active -= 1
+            retry = self.land(limiter, status, headers)
+            self.condition.notify_all()
+        return retry
+
+    def get(self, url, **kwargs):
+        """
+        :return: `requests.Response` of the last attempt, or `CachedResponse` when the server answered 304. The error
+                 of the last attempt is raised when none of them got a response.
+        """
+        response = self.revalidate(url, **kwargs)
+        if response.status_code == 200:
+            self.record(url, response.content, response.headers)
+        return response
+
+    def revalidate(self, url, **kwargs):
+        if self.cache is None:
+            return self.fetch(url, **kwargs)
+        headers = dict(kwargs.pop("headers", None) or {})
+        response = self.fetch(url, headers=dict(headers, **self.cache.headers(url)), **kwargs)
+        if response.status_code == 304:
+            cached = self.cache.get(url)
+            # The body can be gone (Eg: evicted meanwhile). It's requested once more, unconditionally.
+            return cached if cached is not None else self.fetch(url, headers=headers, **kwargs)
+        if response.status_code == 200:
+            self.cache.put(url, response.content, response.headers, response.encoding)
+        return response
+
+    def fetch(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        limiter = self.get_limiter(url)
+        for attempt in range(self.retries + 1):
+            response, error = None, None
+            self.acquire(limiter)
+            try:
+                response = self.session.get(url, **kwargs)
+            except requests.RequestException as e:
+                error = e
+            finally:
+                status = response.status_code if response is not None else None
+                retry = self.release(limiter, status, response.headers if response is not None else None)
+            if not retry or attempt == self.retries:
+                break
+            self.stats.retries += 1
+            delay = self.get_delay(attempt, response.headers if response is not None else None)
+            log.debug("Retrying {} in {:.1f}s. Status: {}; error: {}".format(url, delay, status, error))
+            time.sleep(delay)
+        if response is None:
+            raise error
+        return response
+
+    def close(self):
+        log.info("Transport: {}. Limits: {}".format(self.stats.summary(), self.limits()))
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.archive is not None:
+            self.archive.close()
+
+
+class AsyncTransport(BaseTransport):
+    """
+    `Transport` for asyncio, over one pooled aiohttp session with at most `concurrency` requests in flight overall.
+    To be used as `async with AsyncTransport(..) as transport`. The `HttpCache` and the `Archive` aren't closed with
+    it, so they can be shared with a `Transport`.
+    """
+
+    def __init__(self, concurrency=10, retries=3, backoff=1.0, timeout=30, initial=4, maximum=32, cache=None,
+                 archive=None):
+        super(AsyncTransport, self).__init__(
+            retries, backoff, timeout, initial, min(maximum, concurrency), cache, archive)
+        self.concurrency = concurrency
+        self.condition = None
+        self.session = None
+
+    async def __aenter__(self):
+        self.condition = asyncio.Condition()
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *args):
+        await self.session.close()
+        log.info("Transport: {}. Limits: {}".format(self.stats.summary(), self.limits()))
+
+    async def acquire(self, limiter):
+        async with self.condition:
+            while not limiter.can_start():
+                try:
+                    await asyncio.wait_for(self.condition.wait(), timeout=limiter.wait_time() or 0.1)
+                except asyncio.TimeoutError:
+                    pass
+            limiter.active += 1
+            self.stats.requests += 1
+
+    async def release(self, limiter, status, headers=None):
+        async with self.condition:
+            limiter.active -= 1
+            retry = self.land(limiter, status, headers)
+            self.condition.notify_all()
+        return retry
+
+    async def get(self, url):
+        """
+        :return: (status, text) of the last attempt, or (None, None) when none of them got a response. A 304 is
+                 answered from the cache as (200, text).
+        """
+        status, text, headers = await self.revalidate(url)
+        if status == 200:
+            self.record(url, text, headers)
+        return status, text
+
+    async def revalidate(self, url):
+        if self.cache is None:
+            return await self.fetch(url)
+        status, text, headers = await self.fetch(url, self.cache.headers(url))
+        if status == 304:
+            cached = self.cache.get(url)
+            if cached is not None:
+                return 200, cached.text, cached.headers
+            status, text, headers = await self.fetch(url)
+        if status == 200:
+            self.cache.put(url, text.encode("utf-8"), headers, "utf-8")
+        return status, text, headers
+
+    async def fetch(self, url, request_headers=None):
+        limiter = self.get_limiter(url)
+        status, text, headers = None, None, None
+        for attempt in range(self.retries + 1):
+            headers, error = None, None
+            await self.acquire(limiter)
+            try:
+                async with self.session.get(url, headers=request_headers) as response:
+                    status, headers = response.status, response.headers
+                    text = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status, text, error = None, None, e
+            finally:
+                retry = await self.release(limiter, status, headers)
+            if not retry or attempt == self.retries:
+                break
+            self.stats.retries += 1
+            delay = self.get_delay(attempt, headers)
+            log.debug("Retrying {} in {:.1f}s. Status: {}; error: {}".format(url, delay, status, error))
+            await asyncio.sleep(delay)
+        if status is None:
+            log.error("Error fetching {}: {}".format(url, error))
+        return status, text, headers
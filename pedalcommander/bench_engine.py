@@ -0,0 +1,85 @@
+import time
+import argparse
+import threading
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+from sinks import Sink
+from product_scraper import ProductScraper, AsyncProductFetcher
+
+
+PAGE = (
+    '<html><body><span id="total_products">{count} Products</span><div id="products">{products}</div></body></html>'
+)
+PRODUCT = (
+    '<div class="product-thumb"><a href="/products/product-{idx}"><img src="/product-{idx}.jpg"></a></div>'
+    '<div class="product-info"><a href="/products/product-{idx}">Product {idx}</a></div>'
+)
+
+
+class NullSink(Sink):
+
+    def write_batch(self, rows):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.1
+    body = PAGE.format(count=12, products="".join(PRODUCT.format(idx=idx) for idx in range(12))).encode()
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+def get_args():
+    arg_parser = argparse.ArgumentParser(description="Compares the serial and the async http engine on a local stub.")
+    arg_parser.add_argument('-urls', '--urls', type=int, default=500, help='No. of product-result urls to fetch.')
+    arg_parser.add_argument('-latency', '--latency', type=float, default=0.1, help='Stub response time in seconds.')
+    arg_parser.add_argument('-concurrency', '--concurrency', type=int, default=50, help='Async requests in flight.')
+    return arg_parser.parse_args()
+
+
+def main():
+    args = get_args()
+    StubHandler.latency = args.latency
+    server = ThreadingServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = ["http://127.0.0.1:{}/pages/product-result?rq=yr_{}".format(server.server_port, idx)
+            for idx in range(args.urls)]
+
+    # The serial baseline is one request after another, which is what the browser path does at best.
+    count = min(len(urls), 50)
+    start = time.time()
+    for url in urls[:count]:
+        ProductScraper.parse(url, requests.get(url).text)
+    serial = count / (time.time() - start) * 60
+
+    start = time.time()
+    sink = NullSink(None)
+    fallback = AsyncProductFetcher(args, {}, sink, concurrency=args.concurrency).read(urls)
+    sink.close()
+    concurrent = len(urls) / (time.time() - start) * 60
+
+    server.shutdown()
+    print("serial: {:.0f} urls/min".format(serial))
+    print("async ({} in flight): {:.0f} urls/min; {} products; {} fallbacks".format(
+        args.concurrency, concurrent, sink.count, len(fallback)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import time
+import argparse
+
+from bs4 import BeautifulSoup
+
+import extract
+from product_scraper import ProductScraper
+
+
+NOISE = '<div class="nav-item"><a href="/collections/{idx}"><span>Collection {idx}</span></a><p>{text}</p></div>'
+SELECT = '<select id="dropdown-field_{level}"><option value="">Select</option>{options}</select>'
+OPTION = '<option value="md_{idx}">Model {idx}</option>'
+PRODUCT = (
+    '<div class="product-thumb"><a href="/products/product-{idx}"><img src="/product-{idx}.jpg"></a></div>'
+    '<div class="product-info"><a href="/products/product-{idx}">Product {idx}</a></div>'
+)
+
+
+def get_page(noise):
+    filler = "".join(NOISE.format(idx=idx, text="lorem ipsum " * 20) for idx in range(noise))
+    dropdowns = "".join(
+        SELECT.format(level=level, options="".join(OPTION.format(idx=idx) for idx in range(40)))
+        for level in range(1, 6))
+    products = "".join(PRODUCT.format(idx=idx) for idx in range(24))
+    return (
+        '<html><head><script>var x = 1;</script></head><body>{filler}<div class="dropdowns">{dropdowns}</div>'
+        '<span id="total_products">24 Products</span><div id="products">{products}</div>{filler}</body></html>'
+    ).format(filler=filler, dropdowns=dropdowns, products=products)
+
+
+def bench(fn, html, rounds):
+    start = time.time()
+    for _ in range(rounds):
+        fn(html)
+    return (time.time() - start) / rounds * 1000
+
+
+def options_before(html):
+    soup = BeautifulSoup(html, "html.parser")
+    children = list(soup.find("select", attrs={"id": "dropdown-field_3"}).children)[1:]
+    return dict(zip(map(lambda x: x.attrs["value"], children), map(lambda x: x.get_text(), children)))
+
+
+def options_after(html):
+    soup = extract.soup(html, "select", id="dropdown-field_3")
+    return {dom.attrs["value"]: dom.get_text() for dom in soup.find_all("option")[1:]}
+
+
+def products_before(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return ProductScraper.get_products("", soup.find("div", attrs={"id": "products"}))
+
+
+def products_after(html):
+    return ProductScraper.parse("", html)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Parse time per page of the full vs the targeted extraction.")
+    arg_parser.add_argument('-noise', '--noise', type=int, default=2000, help='No. of filler blocks on the page.')
+    arg_parser.add_argument('-rounds', '--rounds', type=int, default=20, help='No. of parses to average over.')
+    args = arg_parser.parse_args()
+
+    html = get_page(args.noise)
+    assert options_before(html) == options_after(html)
+    assert products_before(html) == products_after(html)
+
+    print("page: {:.0f} KB; parser: {}".format(len(html) / 1024, extract.PARSER))
+    for name, before, after in (("dropdown", options_before, options_after),
+                                ("products", products_before, products_after)):
+        ms_before, ms_after = bench(before, html, args.rounds), bench(after, html, args.rounds)
+        print("{}: full html.parser {:.1f} ms/page; targeted {:.1f} ms/page ({:.1f}x)".format(
+            name, ms_before, ms_after, ms_before / ms_after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import os
+import time
+import argparse
+import tempfile
+
+import extract
+from archive import Archive, replay
+from bench_parse import get_page
+from product_scraper import ProductScraper, PRODUCT_IDS
+
+
+URL = "https://pedalcommander.com/pages/product-result?rq=yr_2019~mk_nissan~md_titan~rk_{idx}~qj_5-6"
+
+
+def parse_whole(url, html):
+    # `ProductScraper.parse` without cutting the elements out with lxml first.
+    return ProductScraper.parse_soup(url, extract.soup(html, id=PRODUCT_IDS))
+
+
+def run(path, parse, processes, pages=None):
+    match = None if pages is None else (lambda url: int(url.split("~rk_")[1].split("~")[0]) < pages)
+    start = time.time()
+    products = sum(len(info) for _, info in replay(path, parse, kind="product-result", match=match,
+                                                   processes=processes))
+    return time.time() - start, products
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Re-extraction time of the products from a recorded archive.")
+    arg_parser.add_argument('-pages', '--pages', type=int, default=18000, help='No. of product-result pages to record.')
+    arg_parser.add_argument('-noise', '--noise', type=int, default=100, help='No. of filler blocks per page.')
+    arg_parser.add_argument('-sample', '--sample', type=int, default=1000,
+                            help='No. of pages the parse of the whole page is timed on, as it is the slow one.')
+    arg_parser.add_argument('-processes', '--processes', type=int, default=None,
+                            help='No. of processes of the parallel replay (Default: one per core).')
+    args = arg_parser.parse_args()
+
+    html = get_page(args.noise)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "products.warc.gz")
+        archive = Archive(path)
+        start = time.time()
+        for idx in range(args.pages):
+            archive.record(URL.format(idx=idx), html, "product-result", engine="http")
+        archive.close()
+        print("recorded: {} pages of {:.0f} KB in {:.2f}s; {:.1f} MB on disk".format(
+            args.pages, len(html) / 1024, time.time() - start, os.path.getsize(path) / 1024 / 1024))
+
+        sample = min(args.sample, args.pages)
+        sec_soup, products_soup = run(path, parse_whole, 1, sample)
+        sec_serial, products_serial = run(path, ProductScraper.parse, 1)
+        sec_parallel, products_parallel = run(path, ProductScraper.parse, args.processes)
+        assert products_soup * args.pages == products_serial * sample
+        assert products_serial == products_parallel
+        print("whole page soup on 1 process: {:.0f} pages/s ({} pages)".format(sample / sec_soup, sample))
+        print("parse on 1 process: {:.2f}s ({:.0f} pages/s)".format(sec_serial, args.pages / sec_serial))
+        print("parse on every core: {:.2f}s ({:.0f} pages/s); {} products".format(
+            sec_parallel, args.pages / sec_parallel, products_parallel))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+
+class OptionCache(object):
+    """
+    Persistent cache of every dropdown option list, keyed by its parent path. Eg: `yr_2020/mk_acura` holds the models
+    of a 2020 Acura and the empty path holds the years.
+
+    An entry is served only while it's younger than `ttl` seconds and its parent's option set didn't change in this
+    run. Whenever a refetched list differs from the cached one the path is remembered in `changed`, so the lists
+    right below it are fetched again as well.
+    """
+
+    def __init__(self, path="options.db", ttl=30 * 24 * 60 * 60):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.changed = set()
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS options (node TEXT PRIMARY KEY, options TEXT, fetched_at REAL)")
+
+    @staticmethod
+    def node(keys):
+        return "/".join(keys)
+
+    def get(self, keys):
+        keys = tuple(keys)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT options, fetched_at FROM options WHERE node = ?", (self.node(keys), )).fetchone()
+            if row is None or time.time() - row[1] > self.ttl or (keys and keys[:-1] in self.changed):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return dict(json.loads(row[0]))
+
+    def put(self, keys, options):
+        keys = tuple(keys)
+        value = json.dumps(list(options.items()))
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT options FROM options WHERE node = ?", (self.node(keys), )).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO options VALUES (?, ?, ?)", (self.node(keys), value, time.time()))
+            if row is not None and set(dict(json.loads(row[0]))) != set(options):
+                log.info("Options changed under '{}'".format(self.node(keys)))
+                self.changed.add(keys)
+
+    def close(self):
+        log.info("Option cache hits: {}; misses: {}".format(self.hits, self.misses))
+        self.conn.close()
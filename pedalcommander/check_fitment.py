@@ -0,0 +1,89 @@
+import json
+import threading
+from urllib.parse import urlparse, parse_qs
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from fitment import FitmentClient, FitmentError
+
+
+LEVELS = ("yr", "mk", "md", "rk", "qj")
+WIDTH = 3
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def get_options(keys):
+    prefix = LEVELS[len(keys)]
+    return {"{}_{}{}".format(prefix, len(keys), idx): "{} {}".format(prefix.upper(), idx) for idx in range(WIDTH)}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Made-up fitment endpoint: WIDTH options at every level, answered in a different shape at every level so each
+    parser of `FitmentClient` is run.
+    """
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query, keep_blank_values=True)
+        rq, level = query["rq"][0], int(query["field"][0])
+        options = get_options(rq.split("~") if rq else [])
+        if level % 2:
+            content_type = "text/html"
+            body = '<html><body><select id="dropdown-field_{}"><option value="">--</option>{}</select></body></html>'
+            body = body.format(level, "".join('<option value="{}">{}</option>'.format(*item) for item in options.items()))
+        elif level == 2:
+            content_type = "application/json"
+            body = json.dumps(options)
+        else:
+            content_type = "application/json"
+            body = json.dumps({"options": [{"value": value, "label": label} for value, label in options.items()]})
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def walk(client, keys=()):
+    options = client.get_options(list(keys))
+    assert options == get_options(list(keys)), options
+    if len(keys) + 1 == len(LEVELS):
+        return [tuple(keys) + (key,) for key in options]
+    leaves = []
+    for key in options:
+        leaves.extend(walk(client, tuple(keys) + (key,)))
+    return leaves
+
+
+def main():
+    server = ThreadingServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    conf = {"FITMENT_URL": "http://127.0.0.1:{}/?rq={{rq}}&field={{level}}".format(server.server_port)}
+
+    client = FitmentClient(conf)
+    try:
+        leaves = walk(client)
+    finally:
+        client.close()
+        server.shutdown()
+    assert len(leaves) == WIDTH ** len(LEVELS), len(leaves)
+    assert len(set(leaves)) == len(leaves)
+
+    try:
+        FitmentClient.parse_html("<html><body><div>No dropdowns</div></body></html>", 1)
+    except FitmentError:
+        pass
+    else:
+        raise AssertionError("parse_html has to raise without the <select>")
+    print("ok: {} leaves over {} levels from the stub".format(len(leaves), len(LEVELS)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import extract
+from bench_parse import get_page
+from product_scraper import ProductScraper, PRODUCT_IDS
+
+
+URL = "https://pedalcommander.com/pages/product-result?rq=yr_2019~mk_nissan~md_titan~rk_1~qj_5-6"
+SPACED = """<html><body>
+<span id="total_products">2 Products</span>
+<div id="products">
+  <div class="product-thumb">
+    <a href="/products/a"><img src="/a.jpg"></a>
+  </div>
+  <div class="product-info">
+    <a href="/products/a">Prod A</a><span>$10</span>
+  </div>
+  <div class="product-thumb"><a href="/products/b"><img src="/b.jpg"></a></div><div class="product-info">Prod B</div>
+</div>
+</body></html>"""
+PAGES = {
+    "bench page": (get_page(20), 24),
+    "whitespace between the tags": (SPACED, 2),
+    "no products": ('<html><body><span id="total_products">No Products found</span></body></html>', 1),
+    "no summary": ('<html><body><div id="products"></div></body></html>', None),
+}
+
+
+def parse_whole(url, html):
+    return ProductScraper.parse_soup(url, extract.soup(html, id=PRODUCT_IDS))
+
+
+def parse_browser(url, html):
+    # What the browser path reads: the outerHTML of #products, once the summary says there are products.
+    info = ProductScraper.parse(url, html)
+    if not info or info[0]["product_url"] == "NA":
+        return info
+    soup = extract.soup(extract.cut(html, ["products"]), id="products")
+    return ProductScraper.get_products(url, soup.find("div", attrs={"id": "products"}))
+
+
+def main():
+    for name, (html, count) in PAGES.items():
+        info = ProductScraper.parse(URL, html)
+        assert info == parse_whole(URL, html), name
+        assert info == parse_browser(URL, html), name
+        assert (None if info is None else len(info)) == count, (name, info)
+        print("ok: {}".format(name))
+
+    info = ProductScraper.parse(URL, SPACED)
+    assert [row["product_name"] for row in info] == ["Prod A", "Prod B"], info
+    assert [row["product_url"] for row in info] == ["/products/a", "/products/b"], info
+    print("parser: {}".format(extract.PARSER))
+
+
+if __name__ == '__main__':
+    main()
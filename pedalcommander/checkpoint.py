@@ -0,0 +1,87 @@
+import sqlite3
+import logging
+import threading
+from datetime import datetime as dt
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+COLUMNS = ("key_engine", "year", "make", "model", "sub_model", "engine")
+SCHEMA = 2
+
+
+class CheckpointStore(object):
+    """
+    On-disk record of the fitment tree crawled so far.
+
+    A node is the path of keys selected down to it, Eg: yr_2020/mk_acura/md_ilx/rk_a-spec. A sub_model node is saved
+    together with its engine leaves in one transaction, so a node is either complete in the store or not there at all.
+    Year, make and model nodes are marked once every child below them is complete.
+    """
+
+    def __init__(self, path="checkpoint.db", resume=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA:
+                if resume:
+                    log.warning("{} was written by an older version and can't be resumed from".format(path))
+                self.conn.execute("DROP TABLE IF EXISTS nodes")
+                self.conn.execute("DROP TABLE IF EXISTS leaves")
+                self.conn.execute("PRAGMA user_version = {}".format(SCHEMA))
+            self.conn.execute("CREATE TABLE IF NOT EXISTS nodes (node TEXT PRIMARY KEY, done_at TEXT)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS leaves (seq INTEGER PRIMARY KEY AUTOINCREMENT, node TEXT, {})".format(
+                    ", ".join("{} TEXT".format(column) for column in COLUMNS)))
+            self.conn.execute("CREATE INDEX IF NOT EXISTS leaves_node ON leaves (node)")
+            if not resume:
+                self.conn.execute("DELETE FROM nodes")
+                self.conn.execute("DELETE FROM leaves")
+
+        if resume:
+            count = self.conn.execute("SELECT COUNT(*) FROM leaves").fetchone()[0]
+            log.info("Resuming from {} with {} combinations already crawled".format(path, count))
+
+    @staticmethod
+    def node(keys):
+        return "/".join(keys)
+
+    def is_done(self, *keys):
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM nodes WHERE node = ?", (self.node(keys), )).fetchone()
+        return row is not None
+
+    def mark(self, *keys):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO nodes VALUES (?, ?)", (self.node(keys), dt.now().isoformat()))
+
+    def complete(self, keys, rows):
+        """
+        Saves a sub_model node with its engine leaves.
+
+        :param keys: keys of the node. Eg: (yr_2020, mk_acura, md_ilx, rk_a-spec)
+        :param rows: `list` of (keys, labels) of the engines below it.
+        :return: None
+        """
+        node = self.node(keys)
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM leaves WHERE node = ?", (node, ))
+            self.conn.executemany(
+                "INSERT INTO leaves (node, {}) VALUES (?, {})".format(", ".join(COLUMNS), ", ".join("?" * len(COLUMNS))),
+                [(node, leaf_keys[-1]) + tuple(labels) for leaf_keys, labels in rows])
+            self.conn.execute("INSERT OR REPLACE INTO nodes VALUES (?, ?)", (node, dt.now().isoformat()))
+
+    def rows(self, *keys):
+        # Leaves of the node itself and of everything below it, in the order they were crawled.
+        # '0' is the character right after '/', so the range below is the prefix match "<node>/*".
+        node = self.node(keys)
+        with self.lock:
+            cursor = self.conn.execute(
+                "SELECT node, {} FROM leaves WHERE node = ? OR (node >= ? AND node < ?) ORDER BY seq".format(
+                    ", ".join(COLUMNS)), (node, node + "/", node + "0"))
+            rows = cursor.fetchall()
+        return [(tuple(row[0].split("/")) + (row[1], ), tuple(row[2:])) for row in rows]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,89 @@
+import logging
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml.html
+    PARSER = "lxml"
+except ImportError:
+    lxml = None
+    PARSER = "html.parser"
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+JS_SELECT_OPTIONS = """
+var select = document.getElementById(arguments[0]);
+if (!select) return null;
+return Array.prototype.slice.call(select.options, 1).map(function (option) {
+    return [option.value, option.textContent];
+});
+"""
+
+JS_TEXT = """
+var element = document.querySelector(arguments[0]);
+return element ? element.textContent : null;
+"""
+
+JS_OUTER_HTML = """
+var element = document.querySelector(arguments[0]);
+return element ? element.outerHTML : null;
+"""
+
+
+def select_options(chrome, field):
+    """
+    Reads the options of a `<select>` in the browser itself, leaving out the placeholder option.
+
+    :param chrome: webdriver instance.
+    :param field: id of the select. Eg: dropdown-field_1
+    :return: `dict` of value => text.
+    """
+    options = chrome.execute_script(JS_SELECT_OPTIONS, field)
+    if options is None:
+        raise ValueError("No select found with id: {}".format(field))
+    return dict((value, text) for value, text in options)
+
+
+def text(chrome, selector):
+    return chrome.execute_script(JS_TEXT, selector)
+
+
+def outer_html(chrome, selector):
+    """
+    :return: HTML of the element matching the css selector, or None when there's no such element. Only the element
+             crosses the webdriver, not the whole page source.
+    """
+    return chrome.execute_script(JS_OUTER_HTML, selector)
+
+
+def soup(html, *args, **kwargs):
+    """
+    Parses only the parts of the page matching the given SoupStrainer arguments, with lxml when it's installed.
+
+    Eg: soup(html, "select", id="dropdown-field_2") or soup(html, id=["products", "total_products"])
+    """
+    only = SoupStrainer(*args, **kwargs) if args or kwargs else None
+    return BeautifulSoup(html, PARSER, parse_only=only)
+
+
+
+def cut(html, ids):
+    """
+    Cuts the elements with the given ids out of the page with lxml, so BeautifulSoup only parses them instead of the
+    whole page. The page is returned as it is when lxml isn't installed or can't read it.
+
+    :param ids: `list` of element ids. Eg: ["total_products", "products"]
+    :return: HTML of the first element of every id, one after another.
+    """
+    if lxml is None or not html.strip():
+        return html
+    try:
+        root = lxml.html.document_fromstring(html)
+    except (ValueError, lxml.etree.LxmlError):
+        return html
+    # One pass over the tree for all the ids, keeping the first element of each.
+    doms = {}
+    for dom in root.xpath("//*[@id][contains($ids, concat(' ', @id, ' '))]", ids=" {} ".format(" ".join(ids))):
+        doms.setdefault(dom.get("id"), dom)
+    return "".join(lxml.html.tostring(dom, encoding="unicode", with_tail=False) for dom in doms.values())
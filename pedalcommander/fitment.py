@@ -0,0 +1,136 @@
+import json
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import extract
+from archive import read_index, read_record
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+# Stands in for FITMENT_URL in the archive urls of the option lists read in the browser. It isn't an endpoint.
+ARCHIVE_URL = "https://pedalcommander.com/?rq={rq}&field={level}"
+
+
+class FitmentError(Exception):
+    pass
+
+
+class FitmentClient(object):
+    """
+    Reads the year/make/model/sub_model/engine dropdowns over plain HTTP instead of driving the browser.
+
+    `FITMENT_URL` in conf.ini is the endpoint the dropdowns are filled from. No public one is known, so it isn't set
+    by default; it has to be found in the browser's network tab. It is formatted with `rq`, the keys selected so far
+    joined by `~` (same as the product-result urls), and `level`, the N of `dropdown-field_N` to read.
+
+    The endpoint may answer with JSON ({value: label}, [{"value": .., "label": ..}] or [[value, label]]) or with HTML
+    holding the `<select id="dropdown-field_N">`. `python check_fitment.py` runs the client against a local stub.
+    """
+
+    def __init__(self, conf, pool_size=1, archive=None):
+        self.url = conf["FITMENT_URL"]
+        self.archive = archive
+        self.timeout = float(conf.get("FITMENT_TIMEOUT", 10))
+        self.session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1), max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @classmethod
+    def enabled(cls, conf):
+        return bool(conf.get("FITMENT_URL"))
+
+    @classmethod
+    def parse_json(cls, data):
+        if isinstance(data, dict):
+            for key in ("options", "data", "results"):
+                if isinstance(data.get(key), (list, dict)):
+                    return cls.parse_json(data[key])
+            return {str(value): str(label) for value, label in data.items()}
+        options = {}
+        for item in data:
+            if isinstance(item, dict):
+                value = item.get("value", item.get("key"))
+                label = item.get("label", item.get("name", item.get("text")))
+            else:
+                value, label = item
+            if value:
+                options[str(value)] = str(label)
+        return options
+
+    @classmethod
+    def parse_html(cls, html, level):
+        soup = extract.soup(html, ["select", "option"])
+        dom_select = soup.find("select", attrs={"id": "dropdown-field_{}".format(level)})
+        if dom_select is None:
+            raise FitmentError("No <select> found for dropdown-field_{}".format(level))
+        dom_options = dom_select.find_all("option")
+        if not dom_options:
+            raise FitmentError("No <option> found for dropdown-field_{}".format(level))
+        return {dom.attrs["value"]: dom.get_text() for dom in dom_options if dom.attrs.get("value")}
+
+    @classmethod
+    def parse(cls, url, text, content_type, level):
+        """
+        :return: `dict` of value => label of the options in a response of the endpoint, JSON or HTML.
+        """
+        if "json" in content_type or text.lstrip()[:1] in ("{", "["):
+            try:
+                return cls.parse_json(json.loads(text))
+            except (ValueError, TypeError, AttributeError) as e:
+                raise FitmentError("Unexpected JSON from {}: {}".format(url, e))
+        return cls.parse_html(text, level)
+
+    def get_options(self, keys):
+        level = len(keys) + 1
+        url = get_url(self.url, keys)
+        response = self.session.get(url, timeout=self.timeout)
+        if response.status_code != 200:
+            raise FitmentError("Status code: {} from {}".format(response.status_code, url))
+
+        content_type = response.headers.get("Content-Type", "")
+        if self.archive is not None:
+            self.archive.record(url, response.text, "fitment", content_type=content_type)
+        return self.parse(url, response.text, content_type, level)
+
+    def close(self):
+        self.session.close()
+
+
+class ArchivedFitment(object):
+    """
+    `FitmentClient` served from the "fitment" records of an `Archive`, so the tree is crawled again with no network
+    and no browser. Responses of the endpoint and page sources recorded by the browser are both parsed.
+    """
+
+    def __init__(self, conf, path):
+        self.url = conf.get("FITMENT_URL")
+        self.lock = threading.Lock()
+        self.file = open(path, "rb")
+        self.entries = {url: (offset, length) for offset, length, _, url in read_index(path, "fitment", latest=True)}
+        log.info("{} option lists are replayed from {}".format(len(self.entries), path))
+
+    def get_options(self, keys):
+        url = get_url(self.url, keys)
+        if url not in self.entries:
+            raise FitmentError("No record of {} in the archive".format(url))
+        with self.lock:
+            header, text = read_record(self.file, *self.entries[url])
+        return FitmentClient.parse(url, text, header.get("content_type", ""), len(keys) + 1)
+
+    def close(self):
+        self.file.close()
+
+
+def get_url(template, keys):
+    """
+    :param template: FITMENT_URL. Without it, `ARCHIVE_URL` stands for the page the browser reads the options from.
+    :return: url the options under `keys` are read from. It's also their url in a recorded archive.
+    """
+    return (template or ARCHIVE_URL).format(rq="~".join(keys), level=len(keys) + 1)
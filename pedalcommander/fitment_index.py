@@ -0,0 +1,263 @@
+import sys
+import mmap
+import time
+import struct
+import logging
+import argparse
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+from sinks import read_rows
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+LEVELS = ("year", "make", "model", "sub_model", "engine")
+MAGIC = b"PCFIDX01"
+SECTIONS = (
+    "string_offsets", "strings",
+    "node_labels", "node_children", "node_child_counts", "node_starts", "node_ends",
+    "vehicle_paths", "vehicle_urls",
+    "product_ids", "product_offsets", "product_vehicles",
+    "vehicle_offsets", "vehicle_products",
+)
+
+
+def get_rq(url):
+    return url.strip().split("rq=")[-1]
+
+
+class FitmentIndex(object):
+    """
+    Reverse index of a crawl: product => vehicles and year/make/model/sub_model/engine => products.
+
+    Every string is stored once in a sorted table, so string ids compare like the strings themselves. Vehicles are
+    numbered in trie order, which makes the vehicles under any trie node one contiguous range [start, end). The
+    postings are CSR arrays (offsets + ids) of uint32. The file is memory-mapped; nothing is loaded up-front.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self.mmap)
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError("{} is not a fitment index".format(path))
+
+        bounds = struct.unpack_from("<{}Q".format(2 * len(SECTIONS)), buffer, len(MAGIC))
+        for idx, name in enumerate(SECTIONS):
+            start, size = bounds[2 * idx], bounds[2 * idx + 1]
+            section = buffer[start:start + size]
+            setattr(self, name, section if name == "strings" else section.cast("I"))
+
+    @classmethod
+    def build(cls, vehicles, products, path):
+        """
+        Builds the index file from the rows of scraper.py and product_scraper.py.
+
+        :param vehicles: rows having year, make, model, sub_model, engine and url.
+        :param products: rows having url (the vehicle's product-result url) and product_url.
+        :param path: path of the index file to be written.
+        :return: `FitmentIndex` instance of the written file.
+        """
+        vehicles = [tuple(str(row[level]) for level in LEVELS) + (row["url"].strip(), ) for row in vehicles]
+        fits = {}
+        for row in products:
+            if row["product_url"] and row["product_url"] != "NA":
+                fits.setdefault(get_rq(row["url"]), set()).add(row["product_url"])
+
+        strings = set(product_url for urls in fits.values() for product_url in urls)
+        for vehicle in vehicles:
+            strings.update(vehicle)
+        strings = sorted(strings, key=lambda x: x.encode("utf-8"))
+        ids = {value: idx for idx, value in enumerate(strings)}
+
+        string_offsets, blob = array("I", [0]), bytearray()
+        for value in strings:
+            blob.extend(value.encode("utf-8"))
+            string_offsets.append(len(blob))
+
+        paths = sorted(tuple(ids[value] for value in vehicle) for vehicle in vehicles)
+        vehicle_paths = array("I", (idx for vehicle in paths for idx in vehicle[:len(LEVELS)]))
+        vehicle_urls = array("I", (vehicle[-1] for vehicle in paths))
+
+        # Level-order build, so the children of every node get contiguous ids.
+        labels, children, child_counts, starts, ends = (array("I") for _ in range(5))
+        labels.append(0)
+        children.append(0)
+        child_counts.append(0)
+        starts.append(0)
+        ends.append(len(paths))
+        nodes = deque([(0, 0)])
+        while nodes:
+            node, depth = nodes.popleft()
+            if depth == len(LEVELS):
+                continue
+            children[node] = len(labels)
+            start = starts[node]
+            while start < ends[node]:
+                end = start
+                while end < ends[node] and paths[end][depth] == paths[start][depth]:
+                    end += 1
+                nodes.append((len(labels), depth + 1))
+                labels.append(paths[start][depth])
+                children.append(0)
+                child_counts.append(0)
+                starts.append(start)
+                ends.append(end)
+                child_counts[node] += 1
+                start = end
+
+        product_ids = array("I", sorted(set(ids[product_url] for urls in fits.values() for product_url in urls)))
+        product_index = {product_id: idx for idx, product_id in enumerate(product_ids)}
+        postings = [[] for _ in product_ids]
+        vehicle_offsets, vehicle_products = array("I", [0]), array("I")
+        for idx, vehicle in enumerate(paths):
+            fitting = sorted(product_index[ids[url]] for url in fits.get(get_rq(strings[vehicle[-1]]), ()))
+            vehicle_products.extend(fitting)
+            vehicle_offsets.append(len(vehicle_products))
+            for product in fitting:
+                postings[product].append(idx)
+        product_offsets, product_vehicles = array("I", [0]), array("I")
+        for posting in postings:
+            product_vehicles.extend(posting)
+            product_offsets.append(len(product_vehicles))
+
+        sections = {
+            "string_offsets": string_offsets, "strings": bytes(blob),
+            "node_labels": labels, "node_children": children, "node_child_counts": child_counts,
+            "node_starts": starts, "node_ends": ends,
+            "vehicle_paths": vehicle_paths, "vehicle_urls": vehicle_urls,
+            "product_ids": product_ids, "product_offsets": product_offsets, "product_vehicles": product_vehicles,
+            "vehicle_offsets": vehicle_offsets, "vehicle_products": vehicle_products,
+        }
+        with open(path, "wb") as f:
+            offset = len(MAGIC) + struct.calcsize("<{}Q".format(2 * len(SECTIONS)))
+            bounds, payload = [], []
+            for name in SECTIONS:
+                data = sections[name] if name == "strings" else sections[name].tobytes()
+                padding = -offset % 4
+                payload.append(b"\0" * padding + data)
+                bounds.extend((offset + padding, len(data)))
+                offset += padding + len(data)
+            f.write(MAGIC)
+            f.write(struct.pack("<{}Q".format(2 * len(SECTIONS)), *bounds))
+            for data in payload:
+                f.write(data)
+
+        log.info("Indexed {} vehicles, {} products and {} fits into {}".format(
+            len(paths), len(product_ids), len(product_vehicles), path))
+        return cls(path)
+
+    def string(self, idx):
+        return bytes(self.strings[self.string_offsets[idx]:self.string_offsets[idx + 1]]).decode("utf-8")
+
+    def find_string(self, value):
+        value = value.encode("utf-8")
+        lo, hi = 0, len(self.string_offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(self.strings[self.string_offsets[mid]:self.string_offsets[mid + 1]]) < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.string_offsets) - 1 and self.string(lo).encode("utf-8") == value:
+            return lo
+        return None
+
+    def find_node(self, *path):
+        node = 0
+        for label in path:
+            label = self.find_string(str(label))
+            if label is None:
+                return None
+            first, count = self.node_children[node], self.node_child_counts[node]
+            idx = bisect_left(self.node_labels, label, first, first + count)
+            if idx == first + count or self.node_labels[idx] != label:
+                return None
+            node = idx
+        return node
+
+    def vehicle(self, idx):
+        offset = idx * len(LEVELS)
+        vehicle = {level: self.string(self.vehicle_paths[offset + depth]) for depth, level in enumerate(LEVELS)}
+        vehicle["url"] = self.string(self.vehicle_urls[idx])
+        return vehicle
+
+    def vehicles(self, *path):
+        node = self.find_node(*path)
+        if node is None:
+            return []
+        return [self.vehicle(idx) for idx in range(self.node_starts[node], self.node_ends[node])]
+
+    def vehicles_for(self, product_url):
+        string = self.find_string(product_url)
+        if string is None:
+            return []
+        idx = bisect_left(self.product_ids, string)
+        if idx == len(self.product_ids) or self.product_ids[idx] != string:
+            return []
+        start, end = self.product_offsets[idx], self.product_offsets[idx + 1]
+        return [self.vehicle(vehicle) for vehicle in self.product_vehicles[start:end]]
+
+    def products_for(self, *path):
+        node = self.find_node(*path)
+        if node is None:
+            return []
+        start, end = self.vehicle_offsets[self.node_starts[node]], self.vehicle_offsets[self.node_ends[node]]
+        products = sorted(set(self.vehicle_products[start:end]))
+        return [self.string(self.product_ids[product]) for product in products]
+
+    def close(self):
+        for name in SECTIONS:
+            getattr(self, name).release()
+        self.mmap.close()
+        self.file.close()
+
+
+def get_args():
+    arg_parser = argparse.ArgumentParser(description="Builds and queries the reverse fitment index.")
+    arg_parser.add_argument('-index', '--index', type=str, default="fitment.idx", help='Path of the index file.')
+    commands = arg_parser.add_subparsers(dest="command")
+
+    build = commands.add_parser("build", help="Build the index from the output of scraper.py and product_scraper.py.")
+    build.add_argument('-data', '--data', type=str, default="data.csv", help='Vehicles scraped by scraper.py.')
+    build.add_argument('-products', '--products', type=str, default="products.csv",
+                       help='Products scraped by product_scraper.py.')
+
+    vehicles = commands.add_parser("vehicles", help="Vehicles fitting a product.")
+    vehicles.add_argument('product_url', type=str, help='Eg: /products/pedal-commander-pc65-bluetooth')
+
+    products = commands.add_parser("products", help="Products fitting a year [make [model [sub_model [engine]]]].")
+    products.add_argument('path', type=str, nargs="+", help='Eg: 2019 Nissan Titan')
+    return arg_parser.parse_args()
+
+
+def main():
+    args = get_args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(asctime)s - %(name)s - %(message)s')
+
+    if args.command == "build":
+        FitmentIndex.build(read_rows(args.data), read_rows(args.products), args.index).close()
+        return
+    if args.command not in ("vehicles", "products"):
+        sys.exit("Give one of the commands: build, vehicles, products. See -h")
+
+    index = FitmentIndex(args.index)
+    start = time.time()
+    if args.command == "vehicles":
+        results = ["{year} {make} {model} {sub_model} {engine}".format(**vehicle)
+                   for vehicle in index.vehicles_for(args.product_url)]
+    else:
+        results = index.products_for(*args.path)
+    elapsed = (time.time() - start) * 1000
+
+    for result in results:
+        print(result)
+    print("{} results in {:.2f} ms".format(len(results), elapsed), file=sys.stderr)
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
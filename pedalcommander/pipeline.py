@@ -0,0 +1,169 @@
+import queue
+import logging
+import argparse
+import threading
+import traceback
+from datetime import datetime as dt
+
+import scraper
+import product_scraper
+from scraper import PCManager, PCWorkerPool
+from product_scraper import ProductScraper, AsyncProductFetcher, DriverPool
+from fitment import FitmentClient
+from archive import open_archive
+from sinks import SINKS, open_sink
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+
+def config_logger(args):
+    """
+    This method is used to configure the logging format.
+
+    :param args: script argument as `ArgumentParser instance`.
+    :return: None
+    """
+    log_level = logging.INFO if args.log_level and args.log_level == 'INFO' else logging.DEBUG
+    log.setLevel(log_level)
+    log_handler = logging.StreamHandler()
+    log_formatter = logging.Formatter('%(levelname)s: %(asctime)s - %(name)s:%(lineno)d - %(message)s')
+    log_handler.setFormatter(log_formatter)
+    log.addHandler(log_handler)
+
+
+class Pipeline(object):
+    """
+    Crawls the fitment tree and scrapes the product-result pages at the same time, with no links.txt in between.
+
+    Every leaf url is put on a queue of `--queue_size` as soon as the crawl finds it, and the product workers take
+    them off while the crawl goes on. A full queue holds the crawl back until the workers catch up, so the whole job
+    takes about as long as the slower of the two stages instead of both of them.
+    """
+
+    def __init__(self, args, conf, archive=None):
+        self.args = args
+        self.conf = conf
+        self.archive = archive
+        self.leaves = queue.Queue(maxsize=args.queue_size)
+        self.manager = None
+        self.found = 0
+
+    def crawl(self):
+        try:
+            if self.args.workers > 1:
+                self.manager = PCWorkerPool(self.args, self.conf, self.archive, self.leaves)
+            else:
+                self.manager = PCManager(self.args, self.conf, archive=self.archive, leaves=self.leaves)
+            self.manager.read().save()
+            self.manager.cache.close()
+        except Exception as e:
+            log.error("Error crawling the fitment tree: {}".format(e))
+            log.debug(traceback.format_exc())
+        finally:
+            self.leaves.put(None)
+
+    def get_urls(self):
+        while True:
+            url = self.leaves.get()
+            if url is None:
+                break
+            self.found += 1
+            yield url
+
+    def read(self):
+        crawler = threading.Thread(target=self.crawl, daemon=True)
+        crawler.start()
+
+        args = self.args
+        sink = open_sink(args.sink, "products", batch_size=args.batch_size)
+        urls = self.get_urls()
+        try:
+            if args.engine == "http":
+                fetcher = AsyncProductFetcher(args, self.conf, sink, concurrency=args.concurrency,
+                                              archive=self.archive)
+                urls = fetcher.read(urls, blocking=True)
+            if urls:
+                DriverPool(args, self.conf, sink, size=args.pool_size, recycle=args.recycle,
+                           archive=self.archive).read(urls)
+        except Exception as e:
+            log.error("Error scraping the products: {}".format(e))
+            log.debug(traceback.format_exc())
+            # Whatever the crawl has left is drained, so it isn't stuck on a full queue and its rows are still saved.
+            for _ in self.get_urls():
+                pass
+        finally:
+            product_scraper.save(args, sink)
+            crawler.join()
+        log.info("{} product-result urls went from the crawl to the product workers".format(self.found))
+        return self
+
+
+def get_args():
+    arg_parser = argparse.ArgumentParser(description="Crawls the fitment tree and scrapes its products in one go.")
+    arg_parser.add_argument('-log-level', '--log_level', type=str, choices=("INFO", "DEBUG"),
+                            default="INFO", help='Where do you want to post the info?')
+    arg_parser.add_argument('-queue-size', '--queue_size', type=int, default=500,
+                            help='No. of product-result urls the crawl can be ahead of the product workers.')
+    arg_parser.add_argument('-workers', '--workers', type=int, default=1,
+                            help='No. of browser sessions to crawl the fitment tree in parallel.')
+    arg_parser.add_argument('-backend', '--backend', type=str, choices=("http", "selenium"), default="http",
+                            help='Read the dropdowns over HTTP (needs FITMENT_URL in conf.ini) or in the browser.')
+    arg_parser.add_argument('-checkpoint', '--checkpoint', type=str, default="checkpoint.db",
+                            help='SQLite file recording every crawled node of the fitment tree.')
+    arg_parser.add_argument('-resume', '--resume', action="store_true",
+                            help='Skip crawling the subtrees already complete in the checkpoint. Their products are '
+                                 'still scraped.')
+    arg_parser.add_argument('-cache', '--cache', type=str, default="options.db",
+                            help='SQLite file caching every dropdown option list by its parent path.')
+    arg_parser.add_argument('-ttl', '--ttl', type=float, default=30,
+                            help='No. of days a cached option list is trusted.')
+    arg_parser.add_argument('-engine', '--engine', type=str, choices=("http", "selenium"), default="http",
+                            help='Fetch the pages over HTTP first, falling back to the browser, or only use the browser.')
+    arg_parser.add_argument('-concurrency', '--concurrency', type=int, default=50,
+                            help='No. of HTTP requests in flight with the http engine.')
+    arg_parser.add_argument('-pool-size', '--pool_size', type=int, default=1,
+                            help='No. of Chrome drivers scraping the product-result pages in parallel.')
+    arg_parser.add_argument('-recycle', '--recycle', type=int, default=200,
+                            help='No. of pages a driver serves before it is restarted.')
+    arg_parser.add_argument('-record', '--record', type=str, default=None,
+                            help='Archive every option list and product-result page fetched to this file.')
+    arg_parser.add_argument('-sink', '--sink', type=str, choices=tuple(SINKS), default="csv",
+                            help='Format the rows and the products are streamed to.')
+    arg_parser.add_argument('-batch-size', '--batch_size', type=int, default=500,
+                            help='No. of rows held in memory before they are written to the sink.')
+    arg_parser.add_argument('-xlsx', '--xlsx', action="store_true",
+                            help='Build data.xlsx and products.xlsx from the sinks once the job is over.')
+    # The crawl is always a full one, from the site.
+    arg_parser.set_defaults(delta=False, replay=None)
+    return arg_parser.parse_args()
+
+
+def main():
+    args = get_args()
+    for configure in (config_logger, scraper.config_logger, product_scraper.config_logger):
+        configure(args)
+    conf = scraper.get_conf()
+
+    start = dt.now().strftime("%d-%m-%Y %H:%M:%S %p")
+    log.info("Script starts at: {}".format(start))
+    PCManager.setup()
+    ProductScraper.setup()
+    if args.backend == "http" and not FitmentClient.enabled(conf):
+        log.warning("FITMENT_URL isn't set in conf.ini, so the dropdowns are read in the browser. See the README.")
+
+    archive = open_archive(args.record)
+    try:
+        Pipeline(args, conf, archive).read()
+    finally:
+        if archive is not None:
+            archive.close()
+
+    ProductScraper.cleanup()
+    PCManager.cleanup()
+    end = dt.now().strftime("%d-%m-%Y %H:%M:%S %p")
+    log.info("Script ends at: {}".format(end))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import argparse
+import configparser
+from urllib.parse import urljoin
+from datetime import datetime as dt
+
+import aiohttp
+from bs4 import NavigableString
+
+import extract
+from sinks import SINKS, open_sink, read_rows, to_xlsx
+
+
+__author__ = "Narendran G"
+__maintainer__ = "Narendran G"
+__contact__ = "+91-8678910063"
+__email__ = "narensundaram007@gmail.com"
+__status__ = "Development"
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+
+def config_logger(args):
+    """
+    This method is used to configure the logging format.
+
+    :param args: script argument as `ArgumentParser instance`.
+    :return: None
+    """
+    log_level = logging.INFO if args.log_level and args.log_level == 'INFO' else logging.DEBUG
+    log.setLevel(log_level)
+    log_handler = logging.StreamHandler()
+    log_formatter = logging.Formatter('%(levelname)s: %(asctime)s - %(name)s:%(lineno)d - %(message)s')
+    log_handler.setFormatter(log_formatter)
+    log.addHandler(log_handler)
+
+
+class ProductDetails(object):
+    """
+    The same product is listed on thousands of vehicle result pages. Every distinct `product_url` found by
+    product_scraper.py is fetched once here, and its details are joined back onto each vehicle row listing it.
+
+    Example url:
+        - Product page: https://pedalcommander.com/products/pedal-commander-pc65-bluetooth
+    """
+    url = "https://pedalcommander.com/"
+    columns = ("name", "description", "price", "price_discount")
+
+    def __init__(self, args, conf, concurrency=20, timeout=30):
+        self.args = args
+        self.conf = conf
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.details = {}
+
+    @classmethod
+    def get_product_description(cls, soup):
+        header, content = "", ""
+        dom_desc = soup.find("div", attrs={"itemprop": "description"})
+        if dom_desc is None:
+            return ""
+        dom_desc_filtered = list(filter(lambda x: not isinstance(x, NavigableString), dom_desc.contents))
+        dom_desc_header = list(filter(lambda x: x.name == "h2", dom_desc_filtered))
+        if dom_desc_header:
+            header = "\n".join([dom.get_text() for dom in dom_desc_header])
+        dom_desc_content = list(filter(lambda x: x.name == "ol", dom_desc_filtered))
+        if dom_desc_content:
+            dom_desc_content_filtered = list(
+                filter(lambda x: not isinstance(x, NavigableString), dom_desc_content[0].contents))
+            content = "\n".join([dom.get_text() for dom in dom_desc_content_filtered])
+        description = header + "\n\n" + content
+        return description
+
+    @classmethod
+    def parse(cls, html):
+        # A plain tag-name strainer; the title, description and prices are picked out of it by their attributes below.
+        soup = extract.soup(html, ["h1", "div", "span"])
+        dom_title = soup.find("h1", attrs={"class": "product__title"})
+        if dom_title is None:
+            return None
+        prices = [dom.get_text() for dom in soup.find_all("span", attrs={"class": "money"})]
+        return {
+            "name": dom_title.get_text().strip(),
+            "description": cls.get_product_description(soup),
+            "price": prices[0] if prices else "",
+            "price_discount": prices[1] if len(prices) > 1 else "",
+        }
+
+    async def fetch(self, session, semaphore, product_url):
+        url = urljoin(self.url, product_url)
+        async with semaphore:
+            try:
+                async with session.get(url) as response:
+                    if response.status != 200:
+                        log.error("Status code: {} from {}".format(response.status, url))
+                        return product_url, None
+                    html = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                log.error("Error fetching {}: {}".format(url, e))
+                return product_url, None
+        return product_url, self.parse(html)
+
+    async def fetch_all(self, product_urls):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            tasks = [self.fetch(session, semaphore, product_url) for product_url in product_urls]
+            for task in asyncio.as_completed(tasks):
+                product_url, info = await task
+                if info is None:
+                    continue
+                self.details[product_url] = info
+                log.info("Fetched details of: {}. So far: {}/{}".format(
+                    product_url, len(self.details), len(product_urls)))
+
+    def read(self, product_urls):
+        asyncio.run(self.fetch_all(product_urls))
+        return self.details
+
+    def join(self, rows, sink):
+        empty = dict.fromkeys(self.columns, "")
+        for row in rows:
+            info = dict(row)
+            info.update(self.details.get(row["product_url"], empty))
+            sink.write(info)
+        return sink
+
+
+def get_args():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-log-level', '--log_level', type=str, choices=("INFO", "DEBUG"),
+                            default="INFO", help='Where do you want to post the info?')
+    arg_parser.add_argument('-products', '--products', type=str, default="products.csv",
+                            help='Output of product_scraper.py holding the vehicle => product rows.')
+    arg_parser.add_argument('-concurrency', '--concurrency', type=int, default=20,
+                            help='No. of product pages fetched in parallel.')
+    arg_parser.add_argument('-sink', '--sink', type=str, choices=tuple(SINKS), default="csv",
+                            help='Format the joined rows are streamed to.')
+    arg_parser.add_argument('-batch-size', '--batch_size', type=int, default=500,
+                            help='No. of rows held in memory before they are written to the sink.')
+    arg_parser.add_argument('-xlsx', '--xlsx', action="store_true",
+                            help='Build product_details.xlsx from the sink once it is over.')
+    return arg_parser.parse_args()
+
+
+def get_conf():
+    conf = configparser.ConfigParser()
+    conf.read("conf.ini")
+    return conf["CONFIG"]
+
+
+def save(args, sink):
+    sink.close()
+    log.info("{} rows are saved to {}".format(sink.count, sink.path))
+    if args.xlsx:
+        to_xlsx(sink.path, "product_details.xlsx")
+
+
+def main():
+    args = get_args()
+    config_logger(args)
+    conf = get_conf()
+
+    start = dt.now().strftime("%d-%m-%Y %H:%M:%S %p")
+    log.info("Script starts at: {}".format(start))
+
+    product_urls = {row["product_url"] for row in read_rows(args.products) if row["product_url"] != "NA"}
+    log.info("{} distinct products are listed in {}".format(len(product_urls), args.products))
+
+    details = ProductDetails(args, conf, concurrency=args.concurrency)
+    details.read(list(product_urls))
+    log.info("Details fetched for {} of {} products".format(len(details.details), len(product_urls)))
+
+    sink = open_sink(args.sink, "product_details", batch_size=args.batch_size)
+    try:
+        details.join(read_rows(args.products), sink)
+    finally:
+        save(args, sink)
+
+    end = dt.now().strftime("%d-%m-%Y %H:%M:%S %p")
+    log.info("Script ends at: {}".format(end))
+
+
+if __name__ == '__main__':
+    main()
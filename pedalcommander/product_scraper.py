@@ -1,11 +1,13 @@
+import queue
+import asyncio
 import logging
 import argparse
+import threading
 import traceback
 import configparser
 from datetime import datetime as dt
 
-import pandas as pd
-from bs4 import BeautifulSoup
+import aiohttp
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -13,6 +15,10 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support import expected_conditions as EC
 
+import extract
+from archive import open_archive, replay
+from sinks import SINKS, open_sink, to_xlsx
+
 
 __author__ = "Narendran G"
 __maintainer__ = "Narendran G"
@@ -22,6 +28,9 @@ __status__ = "Development"
 
 log = logging.getLogger(__file__.split('/')[-1])
 
+# Ids of the elements a product-result page is parsed from.
+PRODUCT_IDS = ["total_products", "products"]
+
 
 def config_logger(args):
     """
@@ -45,11 +54,12 @@ class ProductScraper(object):
         - No products page: https://pedalcommander.com/pages/product-result?rq=yr_1998~mk_smart~md_fortwo-(450)~rk_all~qj_0-6
     """
 
-    def __init__(self, args, conf, chrome, url):
+    def __init__(self, args, conf, chrome, url, archive=None):
         self.url = url
         self.args = args
         self.conf = conf
         self.chrome = chrome
+        self.archive = archive
         self.soup = None
         self.info = []
 
@@ -63,40 +73,254 @@ class ProductScraper(object):
 
     def has_products(self):
         WebDriverWait(self.chrome, 60).until(EC.text_to_be_present_in_element((By.ID, "total_products"), 'Product'))
-        soup = BeautifulSoup(self.chrome.page_source, "html.parser")
-        summary = soup.find("span", attrs={"id": "total_products"}).get_text()
+        summary = extract.text(self.chrome, "#total_products")
         return False if "no products" in summary.lower() else True
 
+    @classmethod
+    def no_products(cls, url):
+        return {
+            "product_name": "No Products",
+            "url": url,
+            "product_url": "NA"
+        }
+
+    @classmethod
+    def get_products(cls, url, dom_products):
+        info = []
+        for dom_product in dom_products.find_all("div", attrs={"class": "product-thumb"}):
+            # Elements only, so whitespace between the tags (Eg: in the browser's outerHTML) doesn't shift the walk.
+            dom_link, dom_info = dom_product.find(), dom_product.find_next_sibling()
+            dom_name = dom_info.find() or dom_info if dom_info is not None else None
+            info.append({
+                "product_name": dom_name.get_text() if dom_name is not None else "",
+                "url": url,
+                "product_url": dom_link.attrs.get("href") if dom_link is not None else None,
+            })
+        return info
+
+    @classmethod
+    def parse(cls, url, html):
+        """
+        Reads the products straight from the HTML of a product-result page, without running its javascript.
+
+        :param url: product-result url the page is fetched from.
+        :param html: page source.
+        :return: `list` of products, or None when the page has no rendered product block.
+        """
+        return cls.parse_soup(url, extract.soup(extract.cut(html, PRODUCT_IDS), id=PRODUCT_IDS))
+
+    @classmethod
+    def parse_soup(cls, url, soup):
+        """
+        :param soup: soup holding the #total_products and #products elements of a product-result page.
+        """
+        dom_summary = soup.find("span", attrs={"id": "total_products"})
+        if dom_summary is None or "product" not in dom_summary.get_text().lower():
+            return None
+        if "no products" in dom_summary.get_text().lower():
+            return [cls.no_products(url)]
+
+        dom_products = soup.find("div", attrs={"id": "products"})
+        info = cls.get_products(url, dom_products) if dom_products else []
+        return info or None
+
     def read(self):
         self.chrome.get(self.url)
         try:
             if self.has_products():
                 WebDriverWait(self.chrome, 10).until(EC.presence_of_element_located((By.CLASS_NAME, 'product-thumb')))
-                html = self.chrome.page_source
-                self.soup = BeautifulSoup(html, "html.parser")
-                dom_products = self.soup.find("div", attrs={"id": "products"})
-                for dom_product in dom_products.find_all("div", attrs={"class": "product-thumb"}):
-                    self.info.append({
-                        "product_name": dom_product.next_sibling.next_element.get_text(),
-                        "url": self.url,
-                        "product_url": dom_product.next_element.attrs["href"],
-                    })
+                html = extract.outer_html(self.chrome, "#products")
+                if html is None:
+                    raise ValueError("No products block found on {}".format(self.url))
+                # Parsed by the same walk as the pages fetched over HTTP.
+                soup = extract.soup(html, id="products")
+                self.info.extend(self.get_products(self.url, soup.find("div", attrs={"id": "products"})))
             else:
-                self.info.append({
-                    "product_name": "No Products",
-                    "url": self.url,
-                    "product_url": "NA"
-                })
+                self.info.append(self.no_products(self.url))
+            if self.archive is not None:
+                self.archive.record(self.url, self.chrome.page_source, "product-result", engine="selenium")
             return self.info
         except (TimeoutException, BaseException) as e:
             log.debug(traceback.format_exc())
             log.error(e)
 
 
+class AsyncProductFetcher(object):
+    """
+    Fetches product-result pages over plain HTTP with at most `concurrency` requests in flight and parses them with
+    `ProductScraper.parse`. Urls whose static HTML has no product block are handed back for the browser.
+
+    The urls can be a list or a blocking iterable fed by another thread (Eg: the crawl in pipeline.py). Only a window
+    of `concurrency * 2` pages is scheduled at a time, so a slow site holds the producer back instead of piling up.
+    """
+
+    def __init__(self, args, conf, sink, concurrency=50, timeout=30, archive=None):
+        self.args = args
+        self.conf = conf
+        self.sink = sink
+        self.archive = archive
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.fallback = []
+
+    async def fetch(self, session, semaphore, url):
+        async with semaphore:
+            try:
+                async with session.get(url) as response:
+                    if response.status != 200:
+                        log.debug("Status code: {} from {}".format(response.status, url))
+                        return url, None
+                    html = await response.text()
+                    if self.archive is not None:
+                        self.archive.record(url, html, "product-result", engine="http")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                log.debug("Error fetching {}: {}".format(url, e))
+                return url, None
+        return url, ProductScraper.parse(url, html)
+
+    def land(self, tasks):
+        for task in tasks:
+            url, info = task.result()
+            if info is None:
+                self.fallback.append(url)
+                continue
+            self.sink.write_many(info)
+            log.info("Fetched for: {}. Found: {}. Total: {}".format(
+                url, len(info), self.sink.count + len(self.sink.batch)))
+
+    async def fetch_all(self, urls, blocking=False):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        urls, pending = iter(urls), set()
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            while True:
+                # A blocking iterable is waited on in a thread, so the requests in flight go on meanwhile.
+                url = await loop.run_in_executor(None, next, urls, None) if blocking else next(urls, None)
+                if url is None:
+                    break
+                if len(pending) >= self.concurrency * 2:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    self.land(done)
+                pending.add(asyncio.ensure_future(self.fetch(session, semaphore, url)))
+            if pending:
+                done, _ = await asyncio.wait(pending)
+                self.land(done)
+
+    def read(self, urls, blocking=False):
+        """
+        :param urls: product-result urls. With `blocking`, an iterable whose `next` may block, Eg: on a queue.
+        :return: `list` of the urls to be scraped in the browser.
+        """
+        asyncio.run(self.fetch_all(urls, blocking))
+        log.info("{} urls have to be scraped in the browser since their HTML has no products".format(
+            len(self.fallback)))
+        return self.fallback
+
+
+class DriverPool(object):
+    """
+    Runs `ProductScraper.read()` on a pool of Chrome drivers.
+
+    Workers take urls from a shared queue and hand their rows to a single collector thread. A worker quits its driver
+    and starts a fresh one after `recycle` pages, so long runs don't grow with Chrome's memory.
+    """
+
+    def __init__(self, args, conf, sink, size=1, recycle=200, archive=None):
+        self.args = args
+        self.conf = conf
+        self.sink = sink
+        self.archive = archive
+        self.size = size
+        self.recycle = recycle
+        self.urls = queue.Queue(maxsize=size * 2)
+        self.rows = queue.Queue()
+
+    def get_driver(self):
+        return webdriver.Chrome(self.conf["CHROME_DRIVER_PATH"])
+
+    def work(self):
+        chrome, pages = None, 0
+        try:
+            while True:
+                url = self.urls.get()
+                if url is None:
+                    break
+                info = []
+                try:
+                    if chrome is None or pages >= self.recycle:
+                        if chrome is not None:
+                            log.debug("Recycling the driver after {} pages".format(pages))
+                            chrome.quit()
+                        chrome, pages = None, 0
+                        chrome = self.get_driver()
+
+                    info = ProductScraper(self.args, self.conf, chrome, url, self.archive).read() or []
+                    pages += 1
+                except Exception as e:
+                    log.error("Error scraping {}: {}".format(url, e))
+                    log.debug(traceback.format_exc())
+                finally:
+                    self.rows.put((url, info))
+        finally:
+            if chrome is not None:
+                chrome.quit()
+
+    def collect(self):
+        while True:
+            item = self.rows.get()
+            if item is None:
+                break
+            url, info = item
+            self.sink.write_many(info)
+            log.info("Fetched for: {}. Found: {}. Total: {}".format(
+                url, len(info), self.sink.count + len(self.sink.batch)))
+
+    def read(self, urls):
+        collector = threading.Thread(target=self.collect, daemon=True)
+        workers = [threading.Thread(target=self.work, daemon=True) for _ in range(self.size)]
+        collector.start()
+        for worker in workers:
+            worker.start()
+
+        try:
+            for url in urls:
+                self.urls.put(url)
+        finally:
+            for _ in workers:
+                self.urls.put(None)
+            for worker in workers:
+                worker.join()
+            self.rows.put(None)
+            collector.join()
+        return self.sink
+
+
 def get_args():
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument('-log-level', '--log_level', type=str, choices=("INFO", "DEBUG"),
                             default="INFO", help='Where do you want to post the info?')
+    arg_parser.add_argument('-pool-size', '--pool_size', type=int, default=1,
+                            help='No. of Chrome drivers scraping the links in parallel.')
+    arg_parser.add_argument('-recycle', '--recycle', type=int, default=200,
+                            help='No. of pages a driver serves before it is restarted.')
+    arg_parser.add_argument('-engine', '--engine', type=str, choices=("http", "selenium"), default="http",
+                            help='Fetch the pages over HTTP first, falling back to the browser, or only use the browser.')
+    arg_parser.add_argument('-concurrency', '--concurrency', type=int, default=50,
+                            help='No. of HTTP requests in flight with the http engine.')
+    arg_parser.add_argument('-record', '--record', type=str, default=None,
+                            help='Archive every product-result page fetched to this file. Eg: products.warc.gz')
+    arg_parser.add_argument('-replay', '--replay', type=str, default=None,
+                            help='Extract the products from the pages recorded in this archive instead of the site.')
+    arg_parser.add_argument('-processes', '--processes', type=int, default=None,
+                            help='No. of processes parsing the pages with --replay (Default: one per core).')
+    arg_parser.add_argument('-sink', '--sink', type=str, choices=tuple(SINKS), default="csv",
+                            help='Format the products are streamed to while scraping.')
+    arg_parser.add_argument('-batch-size', '--batch_size', type=int, default=500,
+                            help='No. of rows held in memory before they are written to the sink.')
+    arg_parser.add_argument('-xlsx', '--xlsx', action="store_true",
+                            help='Build products.xlsx from the sink once the scraping is over.')
     return arg_parser.parse_args()
 
 
@@ -106,9 +330,27 @@ def get_conf():
     return conf["CONFIG"]
 
 
-def save(data):
-    df = pd.DataFrame(data)
-    df.to_excel("products.xlsx", index=False)
+def read_archive(args, sink):
+    """
+    Extracts the products of every page recorded in `--replay`, the last one of each url, on `--processes` cores.
+    Nothing is fetched; urls whose page has no products are listed in the log.
+    """
+    missing = []
+    for url, info in replay(args.replay, ProductScraper.parse, kind="product-result", processes=args.processes):
+        if info is None:
+            missing.append(url)
+            continue
+        sink.write_many(info)
+    log.info("{} products are extracted from {}".format(sink.count + len(sink.batch), args.replay))
+    if missing:
+        log.warning("{} recorded pages have no products: {}".format(len(missing), ", ".join(missing)))
+
+
+def save(args, sink):
+    sink.close()
+    log.info("{} products are saved to {}".format(sink.count, sink.path))
+    if args.xlsx:
+        to_xlsx(sink.path, "products.xlsx")
 
 
 def main():
@@ -120,20 +362,26 @@ def main():
     log.info("Script starts at: {}".format(start))
     ProductScraper.setup()
 
-    data = []
-    chrome = webdriver.Chrome(conf["CHROME_DRIVER_PATH"])
-    try:
+    urls = []
+    if not args.replay:
         with open("links.txt", "r") as f:
-            for url in f.readlines():
-                scraper = ProductScraper(args, conf, chrome, url)
-                info = scraper.read()
-                data.extend(info)
-                log.info("Fetched for: {}. Found: {}. Total: {}".format(url.strip(), len(info), len(data)))
+            urls = [url.strip() for url in f if url.strip()]
+
+    sink = open_sink(args.sink, "products", batch_size=args.batch_size)
+    archive = open_archive(args.record)
+    try:
+        if args.replay:
+            read_archive(args, sink)
+        if args.engine == "http" and urls:
+            urls = AsyncProductFetcher(args, conf, sink, concurrency=args.concurrency, archive=archive).read(urls)
+        if urls:
+            DriverPool(args, conf, sink, size=args.pool_size, recycle=args.recycle, archive=archive).read(urls)
     except BaseException as e:
         log.debug(e)
     finally:
-        save(data)
-        chrome.close()
+        save(args, sink)
+        if archive is not None:
+            archive.close()
 
     ProductScraper.cleanup()
     end = dt.now().strftime("%d-%m-%Y %H:%M:%S %p")
@@ -0,0 +1,109 @@
+from array import array
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+LEVELS = ("year", "make", "model", "sub_model", "engine")
+
+
+class Dictionary(object):
+    """
+    Distinct (key, label) pairs of one level, each stored once. Rows refer to them by code. A key seen again with
+    another label (Eg: renamed on the site midway through a crawl) gets a code of its own, so every row keeps the
+    label it was crawled with.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.labels = []
+        self.codes = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def encode(self, key, label):
+        code = self.codes.get((key, label))
+        if code is None:
+            code = self.codes[(key, label)] = len(self.keys)
+            self.keys.append(key)
+            self.labels.append(label)
+        return code
+
+
+class FitmentRecords(object):
+    """
+    Columnar store of the fitment rows: one int32 code column per level, dictionary-encoded against the distinct
+    keys of that level. A row costs 20 bytes however long its labels are, and the product-result url isn't stored at
+    all but rebuilt from the keys by `get_url` when a row is read.
+    """
+
+    def __init__(self, get_url):
+        self.get_url = get_url
+        self.dictionaries = [Dictionary() for _ in LEVELS]
+        self.codes = [array("i") for _ in LEVELS]
+
+    def __len__(self):
+        return len(self.codes[0])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self.row(idx)
+
+    def append(self, keys, labels):
+        for level, (key, label) in enumerate(zip(keys, labels)):
+            self.codes[level].append(self.dictionaries[level].encode(key, label))
+
+    def clear(self):
+        # The dictionaries are kept, the next batch mostly repeats the same years, makes and models.
+        self.codes = [array("i") for _ in LEVELS]
+
+    def keys(self, idx):
+        return tuple(dictionary.keys[codes[idx]] for dictionary, codes in zip(self.dictionaries, self.codes))
+
+    def row(self, idx):
+        row = {level: dictionary.labels[codes[idx]]
+               for level, dictionary, codes in zip(LEVELS, self.dictionaries, self.codes)}
+        row["url"] = self.get_url(*self.keys(idx))
+        return row
+
+    def urls(self):
+        return [self.get_url(*self.keys(idx)) for idx in range(len(self))]
+
+    def categories(self, level):
+        """
+        Codes of the level renumbered over the labels the rows at hand use, with those labels. The dictionary outlives
+        `clear`, so a batch only carries its own labels rather than every one crawled so far. Labels shared by two keys
+        are merged.
+        """
+        dictionary = self.dictionaries[level]
+        codes = np.frombuffer(self.codes[level], dtype=np.int32) if len(self) else np.empty(0, dtype=np.int32)
+        used, codes = np.unique(codes, return_inverse=True)
+        labels = pd.Index([dictionary.labels[code] for code in used])
+        if labels.is_unique:
+            return codes.astype(np.int32), labels
+        categories = labels.unique()
+        return categories.get_indexer(labels)[codes].astype(np.int32), categories
+
+    def to_frame(self):
+        columns = {}
+        for level, name in enumerate(LEVELS):
+            codes, categories = self.categories(level)
+            columns[name] = pd.Categorical.from_codes(codes, categories=categories)
+        columns["url"] = self.urls()
+        return pd.DataFrame(columns)
+
+    def to_arrow(self):
+        if pa is None:
+            raise ImportError("pyarrow is needed to convert the records to arrow.")
+        columns = {}
+        for level, name in enumerate(LEVELS):
+            codes, categories = self.categories(level)
+            columns[name] = pa.DictionaryArray.from_arrays(pa.array(codes), pa.array(list(categories)))
+        columns["url"] = pa.array(self.urls())
+        return pa.Table.from_pydict(columns)
@@ -1,11 +1,14 @@
+import os
+import time
+import queue
 import logging
 import argparse
+import threading
 import traceback
 import configparser
 from datetime import datetime as dt
 
 import pandas as pd
-from bs4 import BeautifulSoup
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -14,6 +17,14 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support import expected_conditions as EC
 
+import extract
+from fitment import FitmentClient, ArchivedFitment, get_url as get_fitment_url
+from archive import open_archive
+from cache import OptionCache
+from checkpoint import CheckpointStore
+from records import FitmentRecords
+from sinks import SINKS, open_sink, read_rows, to_xlsx
+
 
 __author__ = "Narendran G"
 __maintainer__ = "Narendran G"
@@ -42,14 +53,30 @@ def config_logger(args):
 class PCManager(object):
     url = "https://pedalcommander.com/"
 
-    def __init__(self, args, conf):
+    def __init__(self, args, conf, fitment=None, checkpoint=None, cache=None, archive=None, leaves=None):
         self.args = args
         self.conf = conf
-        self.chrome = webdriver.Chrome(conf["CHROME_DRIVER_PATH"])
+        self._chrome = None
         self.url = PCManager.url
-        self.data = []
+        self.data = FitmentRecords(self.get_url)
+        self.sink = None
         # self.urls = {}
 
+        # Keys currently selected on dropdown-field_1, dropdown-field_2, ... in the browser.
+        self.path = []
+        self.loaded = False
+        self.archive = archive
+        # Queue every product-result url is put on as soon as it's found, Eg: for the product workers of pipeline.py.
+        self.leaves = leaves
+        if fitment is None and args.replay:
+            fitment = ArchivedFitment(conf, args.replay)
+        elif fitment is None and args.backend == "http" and FitmentClient.enabled(conf):
+            fitment = FitmentClient(conf, archive=archive)
+        self.fitment = fitment
+        self.checkpoint = checkpoint or CheckpointStore(args.checkpoint, resume=args.resume)
+        self.cache = cache or OptionCache(args.cache, ttl=args.ttl * 24 * 60 * 60)
+        self.completed = False
+
     @classmethod
     def setup(cls):
         pass
@@ -58,53 +85,75 @@ class PCManager(object):
     def cleanup(cls):
         pass
 
+    @property
+    def chrome(self):
+        if self._chrome is None:
+            self._chrome = webdriver.Chrome(self.conf["CHROME_DRIVER_PATH"])
+        return self._chrome
+
+    def close(self):
+        if self._chrome is not None:
+            self._chrome.close()
+
+    def select(self, keys):
+        if not self.loaded and not self.load():
+            raise Exception("Error loading the pedal-commander.")
+
+        common = 0
+        while common < min(len(keys), len(self.path)) and keys[common] == self.path[common]:
+            common += 1
+        for level in range(common, len(keys)):
+            field = "dropdown-field_{}".format(level + 1)
+            WebDriverWait(self.chrome, 60).until(EC.presence_of_element_located((By.ID, field)))
+            select = Select(self.chrome.find_element_by_id(field))
+            select.select_by_value(keys[level])
+            self.path = list(keys[:level + 1])
+
+    def read_select(self, level):
+        field = "dropdown-field_{}".format(level)
+        WebDriverWait(self.chrome, 60).until(EC.presence_of_element_located((By.ID, field)))
+        return extract.select_options(self.chrome, field)
+
+    def get_options(self, *keys):
+        if self.args.delta:
+            options = self.cache.get(keys)
+            if options is not None:
+                return options
+        options = self.fetch_options(*keys)
+        self.cache.put(keys, options)
+        return options
+
+    def fetch_options(self, *keys):
+        if self.fitment:
+            try:
+                return self.fitment.get_options(keys)
+            except Exception as e:
+                if self.args.replay:
+                    log.warning("Skipping '{}' in the replay: {}".format("~".join(keys), e))
+                    return {}
+                log.warning("HTTP fitment lookup failed for '{}': {}. Falling back to the browser.".format(
+                    "~".join(keys), e))
+        self.select(keys)
+        options = self.read_select(len(keys) + 1)
+        if self.archive is not None:
+            url = get_fitment_url(self.conf.get("FITMENT_URL"), keys)
+            self.archive.record(url, self.chrome.page_source, "fitment", content_type="text/html", engine="selenium")
+        return options
+
     def get_years(self):
-        WebDriverWait(self.chrome, 60).until(EC.presence_of_element_located((By.ID, 'dropdown-field_1')))
-        html = self.chrome.page_source
-        soup = BeautifulSoup(html, "html.parser")
-        children = list(soup.find("select", attrs={"id": "dropdown-field_1"}).children)[1:]
-        years = dict(zip(map(lambda x: x.attrs["value"], children), map(lambda x: x.get_text(), children)))
-        return years
-
-    def get_makes(self, year="yr_2020"):
-        select = Select(self.chrome.find_element_by_id("dropdown-field_1"))
-        select.select_by_value(year)
-
-        WebDriverWait(self.chrome, 60).until(EC.presence_of_element_located((By.ID, 'dropdown-field_2')))
-        soup = BeautifulSoup(self.chrome.page_source, "html.parser")
-        children = list(soup.find("select", attrs={"id": "dropdown-field_2"}).children)[1:]
-        makes = dict(zip(map(lambda x: x.attrs["value"], children), map(lambda x: x.get_text(), children)))
-        return makes
-
-    def get_models(self, make="mk_acura"):
-        select = Select(self.chrome.find_element_by_id("dropdown-field_2"))
-        select.select_by_value(make)
-
-        WebDriverWait(self.chrome, 60).until(EC.presence_of_element_located((By.ID, 'dropdown-field_3')))
-        soup = BeautifulSoup(self.chrome.page_source, "html.parser")
-        children = list(soup.find("select", attrs={"id": "dropdown-field_3"}).children)[1:]
-        models = dict(zip(map(lambda x: x.attrs["value"], children), map(lambda x: x.get_text(), children)))
-        return models
-
-    def get_sub_models(self, model="md_ilx"):
-        select = Select(self.chrome.find_element_by_id("dropdown-field_3"))
-        select.select_by_value(model)
-
-        WebDriverWait(self.chrome, 60).until(EC.presence_of_element_located((By.ID, 'dropdown-field_4')))
-        soup = BeautifulSoup(self.chrome.page_source, "html.parser")
-        children = list(soup.find("select", attrs={"id": "dropdown-field_4"}).children)[1:]
-        sub_models = dict(zip(map(lambda x: x.attrs["value"], children), map(lambda x: x.get_text(), children)))
-        return sub_models
-
-    def get_engines(self, sub_model="rk_a-spec"):
-        select = Select(self.chrome.find_element_by_id("dropdown-field_4"))
-        select.select_by_value(sub_model)
-
-        WebDriverWait(self.chrome, 60).until(EC.presence_of_element_located((By.ID, 'dropdown-field_5')))
-        soup = BeautifulSoup(self.chrome.page_source, "html.parser")
-        children = list(soup.find("select", attrs={"id": "dropdown-field_5"}).children)[1:]
-        engines = dict(zip(map(lambda x: x.attrs["value"], children), map(lambda x: x.get_text(), children)))
-        return engines
+        return self.get_options()
+
+    def get_makes(self, key_year="yr_2020"):
+        return self.get_options(key_year)
+
+    def get_models(self, key_year="yr_2020", key_make="mk_acura"):
+        return self.get_options(key_year, key_make)
+
+    def get_sub_models(self, key_year="yr_2020", key_make="mk_acura", key_model="md_ilx"):
+        return self.get_options(key_year, key_make, key_model)
+
+    def get_engines(self, key_year="yr_2020", key_make="mk_acura", key_model="md_ilx", key_sub_model="rk_a-spec"):
+        return self.get_options(key_year, key_make, key_model, key_sub_model)
 
     def load(self):
         page_loaded = False
@@ -118,7 +167,9 @@ class PCManager(object):
                 log.error("Timeout error!")
                 exit(1)
 
-            return True if page_loaded else False
+            self.path = []
+            self.loaded = True if page_loaded else False
+            return self.loaded
         except Exception as e:
             log.debug(e)
             log.error("Error loading the pedal-commander.")
@@ -128,44 +179,330 @@ class PCManager(object):
             self.url, "/pages/product-result", key_year, key_make, key_model, key_sub_model, key_engine)
         return url
 
+    def restore(self, *keys):
+        rows = self.checkpoint.rows(*keys)
+        log.info("Restored {} combinations under {} from the checkpoint".format(len(rows), "/".join(keys)))
+        return rows
+
+    def crawl_make(self, key_year, year, key_make, make):
+        """
+        Crawls every engine below a make, restoring the subtrees already complete in the checkpoint.
+
+        :return: generator of (keys, labels) of every engine, Eg: ((yr_2020, mk_acura, ...), (2020, Acura, ...))
+        """
+        if self.checkpoint.is_done(key_year, key_make):
+            yield from self.restore(key_year, key_make)
+            return
+
+        for key_model, model in self.get_models(key_year, key_make).items():
+            if self.checkpoint.is_done(key_year, key_make, key_model):
+                yield from self.restore(key_year, key_make, key_model)
+                continue
+
+            for key_sub_model, sub_model in self.get_sub_models(key_year, key_make, key_model).items():
+                keys = (key_year, key_make, key_model, key_sub_model)
+                if self.checkpoint.is_done(*keys):
+                    yield from self.restore(*keys)
+                    continue
+
+                rows = [(keys + (key_engine, ), (year, make, model, sub_model, engine))
+                        for key_engine, engine in self.get_engines(*keys).items()]
+                self.checkpoint.complete(keys, rows)
+                yield from rows
+            self.checkpoint.mark(key_year, key_make, key_model)
+        self.checkpoint.mark(key_year, key_make)
+
+    def crawl_year(self, key_year, year):
+        if self.checkpoint.is_done(key_year):
+            yield from self.restore(key_year)
+            return
+
+        for key_make, make in self.get_makes(key_year).items():
+            yield from self.crawl_make(key_year, year, key_make, make)
+        self.checkpoint.mark(key_year)
+
     def read(self):
         count = 0
+        # Rows restored from the checkpoint are written again, so the sink always starts over.
+        self.sink = open_sink(self.args.sink, "data", batch_size=self.args.batch_size)
         try:
-            if self.load():
+            # The browser is only loaded up-front without the HTTP backend, otherwise it's loaded on first fallback.
+            if self.fitment or self.load():
                 for key_year, year in self.get_years().items():
-                    for key_make, make in self.get_makes(key_year).items():
-                        for key_model, model in self.get_models(key_make).items():
-                            for key_sub_model, sub_model in self.get_sub_models(key_model).items():
-                                for key_engine, engine in self.get_engines(key_sub_model).items():
-                                    self.data.append({
-                                        "year": year,
-                                        "make": make,
-                                        "model": model,
-                                        "sub_model": sub_model,
-                                        "engine": engine,
-                                        "url": self.get_url(key_year, key_make, key_model, key_sub_model, key_engine)
-                                    })
-                                    count += 1
-                                    log.info("Fetched combination for: {}, {}, {}, {}, {}. So far: {}".format(
-                                        year, make, model, sub_model, engine, count))
+                    for keys, labels in self.crawl_year(key_year, year):
+                        self.data.append(keys, labels)
+                        if self.leaves is not None:
+                            self.leaves.put(self.get_url(*keys))
+                        if len(self.data) >= self.args.batch_size:
+                            self.sink.write_records(self.data)
+                            self.data.clear()
+                        count += 1
+                        log.info("Fetched combination for: {}. So far: {}".format(", ".join(labels), count))
+                self.completed = True
             else:
                 log.error("Error loading the pedal-commander. Please check your internet connection.")
                 exit(1)
         except Exception as e:
             log.info(e)
         finally:
-            self.chrome.close()
+            self.sink.write_records(self.data)
+            self.data.clear()
+            self.close()
             return self
 
     def save(self):
-        df = pd.DataFrame(self.data)
-        df.to_excel("data.xlsx", index=False)
+        save(self.args, self.sink)
+
+
+class PCWorkerPool(object):
+    """
+    Crawls the fitment tree on `--workers` independent browser sessions.
+
+    Every year is a shard to begin with. A worker picking up a year while the queue holds fewer shards than there
+    are workers splits that year into one shard per make, so a few large years can't leave the other browsers idle.
+    Rows are kept per (year, make) bucket of `FitmentRecords` and streamed to the sink in the site's order: a bucket is written as soon
+    as every shard before it is done.
+    """
+
+    def __init__(self, args, conf, archive=None, leaves=None):
+        self.args = args
+        self.conf = conf
+        self.workers = args.workers
+        self.archive = archive
+        self.leaves = leaves
+        self.shards = queue.Queue()
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.count = 0
+        self.sink = None
+        self.get_url = None
+
+        # Ordering of the shards: no. of years, makes of every split year and the shards already done.
+        self.years = 0
+        self.splits = {}
+        self.done = set()
+        self.next_year, self.next_make = 0, 0
+        self.checkpoint = CheckpointStore(args.checkpoint, resume=args.resume)
+        self.cache = OptionCache(args.cache, ttl=args.ttl * 24 * 60 * 60)
+        self.failed = 0
+        self.completed = False
+
+    def collect(self, bucket, keys, labels):
+        with self.lock:
+            if bucket not in self.buckets:
+                self.buckets[bucket] = FitmentRecords(self.get_url)
+            self.buckets[bucket].append(keys, labels)
+            self.count += 1
+            count = self.count
+        log.info("Fetched combination for: {}. So far: {}".format(", ".join(labels), count))
+        if self.leaves is not None:
+            self.leaves.put(self.get_url(*keys))
+
+    def finish(self, shard):
+        idx_year, _, _, idx_make = shard
+        with self.lock:
+            # A year split while it was crawled is done make by make, its own shard being the first make.
+            if idx_make is None and idx_year in self.splits:
+                idx_make = 0
+            self.done.add((idx_year, idx_make))
+            self.flush()
+
+    def flush(self):
+        while self.next_year < self.years:
+            idx_year = self.next_year
+            if (idx_year, None) in self.done:
+                for bucket in sorted(bucket for bucket in self.buckets if bucket[0] == idx_year):
+                    self.sink.write_records(self.buckets.pop(bucket))
+            elif idx_year in self.splits:
+                while self.next_make < self.splits[idx_year] and (idx_year, self.next_make) in self.done:
+                    if (idx_year, self.next_make) in self.buckets:
+                        self.sink.write_records(self.buckets.pop((idx_year, self.next_make)))
+                    self.next_make += 1
+                if self.next_make < self.splits[idx_year]:
+                    break
+            else:
+                break
+            self.next_year, self.next_make = self.next_year + 1, 0
+
+    def crawl(self, manager, shard):
+        idx_year, key_year, year, idx_make = shard
+        if idx_make is None and self.checkpoint.is_done(key_year):
+            for keys, labels in manager.restore(key_year):
+                self.collect((idx_year, 0), keys, labels)
+            return
+
+        whole_year = idx_make is None
+        makes = list(manager.get_makes(key_year).items())
+        if not whole_year:
+            makes = makes[idx_make:idx_make + 1]
+        else:
+            idx_make = 0
+            if self.shards.qsize() < self.workers and len(makes) > 1:
+                log.info("Splitting year {} into {} shards by make".format(year, len(makes)))
+                with self.lock:
+                    self.splits[idx_year] = len(makes)
+                for idx in range(1, len(makes)):
+                    self.shards.put((idx_year, key_year, year, idx))
+                makes = makes[:1]
+                whole_year = False
+
+        for idx, (key_make, make) in enumerate(makes, start=idx_make):
+            for keys, labels in manager.crawl_make(key_year, year, key_make, make):
+                self.collect((idx_year, idx), keys, labels)
+        # A split year is left unmarked; on resume it's listed again and each of its makes restored on its own.
+        if whole_year:
+            self.checkpoint.mark(key_year)
+
+    def work(self, manager, loaded=False):
+        try:
+            if not loaded and not manager.fitment and not manager.load():
+                log.error("Worker couldn't load the pedal-commander. Leaving the shards to the other workers.")
+                return
+            while True:
+                shard = self.shards.get()
+                if shard is None:
+                    self.shards.task_done()
+                    break
+                try:
+                    self.crawl(manager, shard)
+                except Exception as e:
+                    with self.lock:
+                        self.failed += 1
+                    log.error("Error crawling the shard {}: {}".format(shard[1:], e))
+                    log.debug(traceback.format_exc())
+                finally:
+                    # Shards that failed are done too; the crawl is then incomplete and resumable, but not stuck.
+                    self.finish(shard)
+                    self.shards.task_done()
+        finally:
+            manager.close()
+
+    def read(self):
+        fitment = None
+        if self.args.replay:
+            fitment = ArchivedFitment(self.conf, self.args.replay)
+        elif self.args.backend == "http" and FitmentClient.enabled(self.conf):
+            fitment = FitmentClient(self.conf, pool_size=self.workers, archive=self.archive)
+        managers = [PCManager(self.args, self.conf, fitment, self.checkpoint, self.cache, self.archive)
+                    for _ in range(self.workers)]
+        self.get_url = managers[0].get_url
+        if not fitment and not managers[0].load():
+            log.error("Error loading the pedal-commander. Please check your internet connection.")
+            for manager in managers:
+                manager.close()
+            exit(1)
+
+        self.sink = open_sink(self.args.sink, "data", batch_size=self.args.batch_size)
+        for idx, (key_year, year) in enumerate(managers[0].get_years().items()):
+            self.shards.put((idx, key_year, year, None))
+        self.years = self.shards.qsize()
+        log.info("{} years are sharded across {} workers".format(self.shards.qsize(), self.workers))
+
+        # The first manager is already on the page, the rest load it inside their own threads.
+        threads = [threading.Thread(target=self.work, args=(manager, idx == 0), daemon=True)
+                   for idx, manager in enumerate(managers)]
+        for thread in threads:
+            thread.start()
+
+        # Workers that died while loading leave their shards behind, so don't wait on a queue nobody drains.
+        while self.shards.unfinished_tasks and any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+        for _ in threads:
+            self.shards.put(None)
+        for thread in threads:
+            thread.join()
+
+        # Whatever is left behind a shard that never ran is still written, in order.
+        for bucket in sorted(self.buckets):
+            self.sink.write_records(self.buckets.pop(bucket))
+        self.completed = not self.failed and not self.shards.unfinished_tasks
+        return self
+
+    def save(self):
+        save(self.args, self.sink)
+
+
+def save(args, sink):
+    sink.close()
+    log.info("{} combinations are saved to {}".format(sink.count, sink.path))
+    if args.xlsx:
+        to_xlsx(sink.path, "data.xlsx")
+
+
+def get_rq(url):
+    return url.strip().split("rq=")[-1]
+
+
+def load_links(path):
+    """
+    Reads the product-result urls of a previous run, from links.txt or the `url` column of data.xlsx or a sink.
+
+    :param path: path of links.txt, data.xlsx or a sink. Eg: data.csv
+    :return: `dict` of rq => url.
+    """
+    if not os.path.exists(path):
+        log.warning("No previous run found at {}. Every url will be reported as added.".format(path))
+        return {}
+    if path.endswith(".xlsx"):
+        urls = pd.read_excel(path)["url"].dropna().tolist()
+    elif path.rsplit(".", 1)[-1] in SINKS:
+        urls = [row["url"] for row in read_rows(path)]
+    else:
+        with open(path, "r") as f:
+            urls = [line for line in f.readlines() if line.strip()]
+    return {get_rq(url): url.strip() for url in urls}
+
+
+def get_previous():
+    """
+    :return: path of the newest output of the previous runs, data.xlsx or a data sink of any format. links.txt, the
+             snapshot kept in the repo, only when no run has been saved here yet.
+    """
+    outputs = [path for path in ["data.xlsx"] + ["data.{}".format(ext) for ext in SINKS] if os.path.exists(path)]
+    return max(outputs, key=os.path.getmtime) if outputs else "links.txt"
+
+
+def save_delta(previous, data):
+    current = {get_rq(row["url"]): row["url"] for row in data}
+    added = [url for rq, url in current.items() if rq not in previous]
+    removed = [url for rq, url in previous.items() if rq not in current]
+    for path, urls in (("links_added.txt", added), ("links_removed.txt", removed)):
+        with open(path, "w") as f:
+            f.writelines("{}\n".format(url) for url in urls)
+    log.info("Delta from the previous run: {} urls added, {} urls removed".format(len(added), len(removed)))
 
 
 def get_args():
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument('-log-level', '--log_level', type=str, choices=("INFO", "DEBUG"),
                             default="INFO", help='Where do you want to post the info?')
+    arg_parser.add_argument('-workers', '--workers', type=int, default=1,
+                            help='No. of browser sessions to crawl the fitment tree in parallel.')
+    arg_parser.add_argument('-backend', '--backend', type=str, choices=("http", "selenium"), default="http",
+                            help='Read the dropdowns over HTTP (needs FITMENT_URL in conf.ini) or in the browser.')
+    arg_parser.add_argument('-checkpoint', '--checkpoint', type=str, default="checkpoint.db",
+                            help='SQLite file recording every crawled node of the fitment tree.')
+    arg_parser.add_argument('-resume', '--resume', action="store_true",
+                            help='Skip the subtrees already complete in the checkpoint instead of starting over.')
+    arg_parser.add_argument('-delta', '--delta', action="store_true",
+                            help='Reuse the cached option lists and write the urls added/removed since the last run.')
+    arg_parser.add_argument('-previous', '--previous', type=str, default=None,
+                            help='links.txt, data.xlsx or a data sink of the last run to diff against (Default: the '
+                                 'newest of data.xlsx and the data sinks, else links.txt).')
+    arg_parser.add_argument('-cache', '--cache', type=str, default="options.db",
+                            help='SQLite file caching every dropdown option list by its parent path.')
+    arg_parser.add_argument('-ttl', '--ttl', type=float, default=30,
+                            help='No. of days a cached option list is trusted in --delta mode.')
+    arg_parser.add_argument('-record', '--record', type=str, default=None,
+                            help='Archive every option list fetched to this file. Eg: fitment.warc.gz')
+    arg_parser.add_argument('-replay', '--replay', type=str, default=None,
+                            help='Crawl the option lists recorded in this archive instead of the site.')
+    arg_parser.add_argument('-sink', '--sink', type=str, choices=tuple(SINKS), default="csv",
+                            help='Format the rows are streamed to while crawling.')
+    arg_parser.add_argument('-batch-size', '--batch_size', type=int, default=500,
+                            help='No. of rows held in memory before they are written to the sink.')
+    arg_parser.add_argument('-xlsx', '--xlsx', action="store_true",
+                            help='Build data.xlsx from the sink once the crawl is over.')
     return arg_parser.parse_args()
 
 
@@ -184,8 +521,30 @@ def main():
     log.info("Script starts at: {}".format(start))
     PCManager.setup()
 
-    manager = PCManager(args, conf)
+    if args.replay:
+        # A replay leaves the checkpoint and the option cache of the live crawls alone; archived lists aren't fresh.
+        if args.resume or args.delta:
+            log.warning("--resume and --delta are ignored with --replay")
+        args.checkpoint, args.cache, args.resume, args.delta = ":memory:", ":memory:", False, False
+    elif args.backend == "http" and not FitmentClient.enabled(conf):
+        log.warning("FITMENT_URL isn't set in conf.ini, so the dropdowns are read in the browser. See the README.")
+
+    previous = None
+    if args.delta:
+        previous = load_links(args.previous or get_previous())
+
+    archive = open_archive(args.record)
+    manager = PCWorkerPool(args, conf, archive) if args.workers > 1 else PCManager(args, conf, archive=archive)
     manager.read().save()
+    manager.cache.close()
+    if archive is not None:
+        archive.close()
+
+    if previous is not None:
+        if manager.completed:
+            save_delta(previous, read_rows(manager.sink.path))
+        else:
+            log.error("The crawl didn't complete, so no delta is written. Run again with --resume --delta.")
 
     PCManager.cleanup()
     end = dt.now().strftime("%d-%m-%Y %H:%M:%S %p")
@@ -194,77 +553,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
-
-# class PCScraper(object):
-#
-#     def __init__(self, url):
-#         self.chrome = webdriver.Chrome(r"C:\Users\ngnanasu\Documents\chromedriver\chromedriver.exe")
-#         self.url = url
-#         self.data = []
-#         self.soup = None
-#
-#     def get_page_type(self):
-#         try:
-#             WebDriverWait(self.chrome, 20).until(EC.presence_of_element_located((By.ID, 'products')))
-#             return "list"
-#         except TimeoutException as e:
-#             try:
-#                 WebDriverWait(self.chrome, 20).until(EC.presence_of_element_located((By.ID, 'template-product')))
-#                 return "detail"
-#             except TimeoutException as e:
-#                 return ""
-#
-#     def get_product_urls(self):
-#         urls = []
-#         type_ = self.get_page_type()
-#         if type_ == "list":
-#             WebDriverWait(self.chrome, 20).until(EC.presence_of_element_located((By.CLASS_NAME, 'product-thumb')))
-#             soup = BeautifulSoup(self.chrome.page_source, "html.parser")
-#             product_thumbs = soup.find_all("div", attrs={"class": "product-thumb"})
-#             for thumb in product_thumbs:
-#                 urls.append(thumb.next_element.attrs["href"])
-#         elif type_ == "detail":
-#             return urls.append(self.chrome.current_url)
-#         return urls
-#
-#     @classmethod
-#     def get_product_description(cls, soup):
-#         header, content = "", ""
-#         dom_desc = soup.find("div", attrs={"itemprop": "description"}).contents
-#         dom_desc_filtered = list(filter(lambda x: not isinstance(x, NavigableString), dom_desc))
-#         dom_desc_header = list(filter(lambda x: x.name == "h2", dom_desc_filtered))
-#         if dom_desc_header:
-#             header = "\n".join([dom.get_text() for dom in dom_desc_header])
-#         dom_desc_content = list(filter(lambda x: x.name == "ol", dom_desc_filtered))
-#         if dom_desc_content:
-#             dom_desc_content_filtered = list(
-#                 filter(lambda x: not isinstance(x, NavigableString), dom_desc_content[0].contents))
-#             content = "\n".join([dom.get_text() for dom in dom_desc_content_filtered])
-#         description = header + "\n\n" + content
-#         return description
-#
-#     def get_product_info(self, product_url):
-#         info = {}
-#
-#         self.chrome.get(product_url)
-#         loaded = WebDriverWait(self.chrome, 10).until(EC.presence_of_element_located((By.CLASS_NAME, 'money')))
-#         if loaded:
-#             soup = BeautifulSoup(self.chrome.page_source, "html.parser")
-#             info.update({
-#                 "name": soup.find("h1", attrs={"class": "product__title"}).get_text(),
-#                 "description": self.get_product_description(soup),
-#                 "price": soup.find_all("span", attrs={"class": "money"})[0].get_text(),
-#                 "price_discount": soup.find_all("span", attrs={"class": "money"})[1].get_text()
-#             })
-#
-#         return info
-#
-#     def get(self):
-#         self.chrome.get(self.url)
-#         product_urls = self.get_product_urls()
-#         for product_url in product_urls:
-#             info = self.get_product_info(product_url)
-#             self.data.append(info)
-#         self.chrome.close()
-#         return self.data
@@ -0,0 +1,206 @@
+import os
+import csv
+import glob
+import json
+import shutil
+import logging
+
+from openpyxl import Workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+log = logging.getLogger(__file__.split('/')[-1])
+
+
+class Sink(object):
+    """
+    Appends rows to disk in batches of `batch_size` while the scraper runs, so nothing but the current batch is held
+    in memory and a killed run keeps every batch flushed before it.
+    """
+    extension = ""
+
+    def __init__(self, path, batch_size=500):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch = []
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, row):
+        self.batch.append(row)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def write_records(self, records):
+        # Columnar records (Eg: `FitmentRecords`) are written row by row, unless the sink can take them as a table.
+        self.write_many(records)
+
+    def flush(self):
+        if self.batch:
+            self.write_batch(self.batch)
+            self.count += len(self.batch)
+            self.batch = []
+
+    def write_batch(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    @classmethod
+    def read(cls, path):
+        raise NotImplementedError
+
+
+class FileSink(Sink):
+
+    def __init__(self, path, batch_size=500):
+        super(FileSink, self).__init__(path, batch_size)
+        self.file = open(path, "a", encoding="utf-8", newline="")
+
+    def write_lines(self, rows):
+        raise NotImplementedError
+
+    def write_batch(self, rows):
+        self.write_lines(rows)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        super(FileSink, self).close()
+        self.file.close()
+
+
+class CsvSink(FileSink):
+    extension = "csv"
+
+    def __init__(self, path, batch_size=500):
+        super(CsvSink, self).__init__(path, batch_size)
+        self.writer = None
+
+    def write_lines(self, rows):
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=list(rows[0].keys()), extrasaction="ignore")
+            if not self.file.tell():
+                self.writer.writeheader()
+        self.writer.writerows(rows)
+
+    @classmethod
+    def read(cls, path):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                yield row
+
+
+class JsonlSink(FileSink):
+    extension = "jsonl"
+
+    def write_lines(self, rows):
+        self.file.writelines("{}\n".format(json.dumps(row, ensure_ascii=False)) for row in rows)
+
+    @classmethod
+    def read(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class ParquetSink(Sink):
+    """
+    Writes every batch as its own part file under the `path` directory. A part is written to a temporary name and
+    renamed once complete, so the directory only ever holds whole batches.
+    """
+    extension = "parquet"
+
+    def __init__(self, path, batch_size=500):
+        if pa is None:
+            raise ImportError("pyarrow is needed to write parquet. Install it or use another sink.")
+        super(ParquetSink, self).__init__(path, batch_size)
+        os.makedirs(path, exist_ok=True)
+        self.part = len(glob.glob(os.path.join(path, "part-*.parquet")))
+
+    def write_records(self, records):
+        self.flush()
+        if len(records):
+            self.write_table(records.to_arrow())
+            self.count += len(records)
+
+    def write_batch(self, rows):
+        columns = list(rows[0].keys())
+        self.write_table(pa.Table.from_pydict({column: [row.get(column) for row in rows] for column in columns}))
+
+    def write_table(self, table):
+        path = os.path.join(self.path, "part-{:05d}.parquet".format(self.part))
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self.part += 1
+
+    @classmethod
+    def read(cls, path):
+        for part in sorted(glob.glob(os.path.join(path, "part-*.parquet"))):
+            for row in pq.read_table(part).to_pylist():
+                yield row
+
+
+SINKS = {sink.extension: sink for sink in (CsvSink, JsonlSink, ParquetSink)}
+
+
+def open_sink(kind, name, batch_size=500, append=False):
+    """
+    Opens the sink of the given kind at `<name>.<extension>`.
+
+    :param kind: one of csv, jsonl or parquet.
+    :param name: output path without the extension. Eg: data
+    :param batch_size: no. of rows held in memory before they are written.
+    :param append: keep the rows of a previous run instead of starting over.
+    :return: `Sink` instance.
+    """
+    cls = SINKS[kind]
+    path = "{}.{}".format(name, cls.extension)
+    if not append and os.path.isdir(path):
+        shutil.rmtree(path)
+    elif not append and os.path.exists(path):
+        os.remove(path)
+    log.info("Rows are streamed to {}".format(path))
+    return cls(path, batch_size)
+
+
+def read_rows(path):
+    return SINKS[path.rsplit(".", 1)[-1]].read(path)
+
+
+def to_xlsx(path, xlsx_path):
+    """
+    Builds an excel file from the rows of a sink using openpyxl's write-only mode, one row at a time.
+
+    :param path: path of the sink. Eg: data.csv
+    :param xlsx_path: path of the excel file to be written.
+    :return: no. of rows written.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    columns, count = None, 0
+    for row in read_rows(path):
+        if columns is None:
+            columns = list(row.keys())
+            sheet.append(columns)
+        sheet.append([row.get(column) for column in columns])
+        count += 1
+    workbook.save(xlsx_path)
+    log.info("{} rows from {} are saved to {}".format(count, path, xlsx_path))
+    return count